@@ -0,0 +1,109 @@
+import csv
+import json
+import heapq
+import hashlib
+import def_keys
+
+
+EXPORT_SEED = 12345   # seed of the reservoir sampling of the exported samples
+
+# columns of the exported alignment rows: the alignment statistics, the
+# DBnary definition, and the lemmas of the synset and of the definition
+EXPORT_FIELDS = [ "wncode", "defkey", "srcMatch", "langMatch", "srcMax", "langMax",
+                  "srcPc", "langPc", "score", "isCand",
+                  "word", "pos", "longPos", "gloss", "wnLemmas", "wkSynonyms", "wkTranslations" ]
+
+
+def getSamplePriority(seed, itemKey):
+    return int.from_bytes(hashlib.blake2b(("%d:%s" % (seed, itemKey)).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def reservoirSample(items, numItems, seed=EXPORT_SEED, key=str):
+    """
+    Returns a uniform random sample of numItems of the items of an
+    iterator, sorted by key, keeping only the sample in memory. Each
+    item gets a pseudo-random priority from the seed and its key, and
+    the items of lowest priority are kept, so that the sample does not
+    depend on the order in which the items are read.
+    """
+    heap = []   # (-priority, item number, item) of the sample
+    for i, item in enumerate(items):
+        priority = getSamplePriority(seed, key(item))
+        if len(heap) < numItems:
+            heapq.heappush(heap, (-priority, i, item))
+        elif -priority > heap[0][0]:
+            heapq.heapreplace(heap, (-priority, i, item))
+    return sorted([ item for _, _, item in heap ], key=key)
+
+
+def getLemmaPairs(recList):
+    return [ [rec.lemma, rec.lang] for rec in recList ]
+
+
+def iterAlignmentRows(alignedItems, dictWnTrans, dictWkTrans, dictWkSynm, dictWkDef):
+    """
+    Yields one row, a dictionary of EXPORT_FIELDS, for each alignment
+    of the (wncode, alignedList) items, with the lemmas as [lemma, lang]
+    pairs. Only the records of the current row are looked up.
+    """
+    for wncode, alignedList in alignedItems:
+        wnLemmas = getLemmaPairs(dictWnTrans.get(wncode, ()))
+        for s in alignedList:
+            defRec = dictWkDef.get(s.defkey)
+            yield { "wncode": wncode, "defkey": def_keys.hexKey(s.defkey),
+                    "srcMatch": s.srcMatch, "langMatch": s.langMatch, "srcMax": s.srcMax, "langMax": s.langMax,
+                    "srcPc": s.srcPc, "langPc": s.langPc, "score": s.score, "isCand": s.isCand,
+                    "word": defRec.word if defRec else "", "pos": defRec.pos if defRec else "",
+                    "longPos": defRec.longPos if defRec else "", "gloss": defRec.gloss if defRec else "",
+                    "wnLemmas": wnLemmas,
+                    "wkSynonyms": getLemmaPairs(dictWkSynm.get(s.defkey, ())),
+                    "wkTranslations": getLemmaPairs(dictWkTrans.get(s.defkey, ())) }
+
+
+def getTsvValue(value):
+    if isinstance(value, list):
+        return "; ".join( lemma+"@"+lang for lemma, lang in value )
+    return value
+
+
+def writeTsv(rows, fileName):
+    """Writes the rows to a TSV file with a header line, one row at a time;
+    the lemmas are written as lemma@lang, separated by "; "."""
+    numRows = 0
+    with open(fileName, "w", encoding='utf-8', newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow([ getTsvValue(row[field]) for field in EXPORT_FIELDS ])
+            numRows += 1
+    return numRows
+
+
+def writeJsonl(rows, fileName):
+    """Writes the rows to a JSON Lines file, one row at a time."""
+    numRows = 0
+    with open(fileName, "w", encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            numRows += 1
+    return numRows
+
+
+def exportAlignments(dictAlign, dictWnTrans, dictWkTrans, dictWkSynm, dictWkDef, fileName, numSynsets=0):
+    """
+    Exports the alignments, with their DBnary and wordnet context, to
+    a .tsv or .jsonl file. With numSynsets, only the alignments of a
+    reservoir sample of that many synsets, drawn from the keys, are read
+    and exported. Returns the number of rows written.
+    """
+    if numSynsets:
+        alignedItems = ( (wncode, dictAlign[wncode]) for wncode in reservoirSample(iter(dictAlign), numSynsets) )
+    else:
+        alignedItems = iter(dictAlign.items())
+    rows = iterAlignmentRows(alignedItems, dictWnTrans, dictWkTrans, dictWkSynm, dictWkDef)
+    if fileName.endswith(".jsonl"):
+        return writeJsonl(rows, fileName)
+    if fileName.endswith(".tsv"):
+        return writeTsv(rows, fileName)
+    raise ValueError("Unknown export format: "+fileName)
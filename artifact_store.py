@@ -0,0 +1,174 @@
+import sqlite3
+import pathlib
+import itertools
+from array import array
+from collections.abc import Mapping, ItemsView, ValuesView
+from ds import WnDByTransRecord, DByDefRecord, AlignStatsRecord, RecordBucket
+
+
+SQLITE_BATCH_ROWS = 50000   # rows per executemany batch
+
+# table of each artifact: key column, record type, and whether the
+# key maps to a list of records. The record columns are declared
+# without a type, so that ints and floats are read back unchanged.
+ARTIFACT_TABLES = { "wk_def": ("defkey", DByDefRecord, False),
+                    "wk_trans": ("defkey", WnDByTransRecord, True),
+                    "wk_synm": ("defkey", WnDByTransRecord, True),
+                    "wn_trans": ("wncode", WnDByTransRecord, True),
+                    "alignment": ("wncode", AlignStatsRecord, True) }
+
+# indexes of each table, created after the bulk inserts
+ARTIFACT_INDEXES = { "wk_def": [("defkey",)],
+                     "wk_trans": [("defkey",), ("lemma", "lang")],
+                     "wk_synm": [("defkey",), ("lemma", "lang")],
+                     "wn_trans": [("wncode",), ("lemma", "lang")],
+                     "alignment": [("wncode",), ("defkey",)] }
+
+
+def getColumns(table):
+    keyColumn, recordType, _ = ARTIFACT_TABLES[table]
+    return [keyColumn] + list(recordType._fields)
+
+
+def getColumnValue(x):
+    if isinstance(x, bytes):
+        return x.hex()   # binary defkeys are stored in their hex form
+    if isinstance(x, (list, tuple, array)):
+        return " ".join(map(str, x))
+    return x
+
+
+def iterRows(table, dictToSave):
+    """Yields the table rows of the records; lineNumList is stored as text,
+    and the defkeys in their hex form."""
+    _, _, isList = ARTIFACT_TABLES[table]
+    for key, value in dictToSave.items():
+        key = getColumnValue(key)
+        for rec in (value if isList else [value]):
+            yield (key,) + tuple( getColumnValue(x) for x in rec )
+
+
+def writeTable(conn, table, dictToSave):
+    """
+    Replaces the rows of a table with the records of a dictionary,
+    in key order, with batched executemany calls. The indexes are
+    dropped during the inserts and created again after them.
+    """
+    columns = getColumns(table)
+    conn.execute("CREATE TABLE IF NOT EXISTS %s (%s)" % (table, ", ".join(columns)))
+    for indexColumns in ARTIFACT_INDEXES[table]:
+        conn.execute("DROP INDEX IF EXISTS %s" % getIndexName(table, indexColumns))
+    conn.execute("DELETE FROM %s" % table)
+    sqlString = "INSERT INTO %s (%s) VALUES (%s)" % (table, ", ".join(columns), ", ".join("?"*len(columns)))
+    rows = iterRows(table, dictToSave)
+    batch = list(itertools.islice(rows, SQLITE_BATCH_ROWS))
+    while batch:
+        conn.executemany(sqlString, batch)
+        batch = list(itertools.islice(rows, SQLITE_BATCH_ROWS))
+    for indexColumns in ARTIFACT_INDEXES[table]:
+        conn.execute("CREATE INDEX %s ON %s (%s)" % (getIndexName(table, indexColumns), table, ", ".join(indexColumns)))
+
+
+def getIndexName(table, indexColumns):
+    return "idx_%s_%s" % (table, "_".join(indexColumns))
+
+
+def writeArtifacts(dbFilePath, dictsByTable):
+    """
+    Writes the given dictionaries, keyed by table name, into the
+    SQLite artifact store, all in one transaction.
+    """
+    conn = sqlite3.connect(dbFilePath)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            for table, dictToSave in dictsByTable.items():
+                writeTable(conn, table, dictToSave)
+    finally:
+        conn.close()
+    return dbFilePath
+
+
+def openArtifactStore(dbFilePath):
+    """Opens the SQLite artifact store read-only; the path is quoted in the URI."""
+    return sqlite3.connect(pathlib.Path(dbFilePath).resolve().as_uri() + "?mode=ro", uri=True)
+
+
+class SqliteItemsView(ItemsView):
+    def __iter__(self):
+        return self._mapping.iterItems()
+
+
+class SqliteValuesView(ValuesView):
+    def __iter__(self):
+        for _, value in self._mapping.iterItems():
+            yield value
+
+
+class SqliteRecordDict(Mapping):
+    """
+    Read-only dictionary view over a table of the artifact store.
+    Looking up a key queries only its rows, through the key index;
+    iteration follows the original key order.
+    """
+
+    def __init__(self, conn, table):
+        self.conn = conn
+        self.table = table
+        self.keyColumn, self.recordType, self.isList = ARTIFACT_TABLES[table]
+        self.columns = getColumns(table)
+        self.selectString = "SELECT %s FROM %s" % (", ".join(self.columns), table)
+
+    def makeRecord(self, row):
+        rec = self.recordType._make(row[1:])
+        if self.table == "wk_def":
+            # several line numbers are stored as text
+            if isinstance(rec.lineNumList, str):
+                lineNums = tuple(map(int, rec.lineNumList.split()))
+                rec = rec._replace(lineNumList=lineNums[0] if len(lineNums) == 1 else lineNums)
+        return rec
+
+    def makeValue(self, rows):
+        records = [ self.makeRecord(row) for row in rows ]
+        if self.recordType is WnDByTransRecord:
+            return RecordBucket(records)
+        return records if self.isList else records[0]
+
+    def __getitem__(self, key):
+        rows = self.conn.execute(self.selectString+" WHERE %s=? ORDER BY rowid" % self.keyColumn, (key,)).fetchall()
+        if not rows:
+            raise KeyError(key)
+        return self.makeValue(rows)
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM %s WHERE %s=? LIMIT 1" % (self.table, self.keyColumn),
+                                 (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(DISTINCT %s) FROM %s" % (self.keyColumn, self.table)).fetchone()[0]
+
+    def __iter__(self):
+        cur = self.conn.execute("SELECT %s FROM %s ORDER BY rowid" % (self.keyColumn, self.table))
+        for key, _ in itertools.groupby(row[0] for row in cur):
+            yield key
+
+    def iterItems(self):
+        # the rows of a key are contiguous, since they were inserted together
+        cur = self.conn.execute(self.selectString+" ORDER BY rowid")
+        for key, rows in itertools.groupby(cur, key=lambda row: row[0]):
+            yield key, self.makeValue(list(rows))
+
+    def items(self):
+        return SqliteItemsView(self)
+
+    def values(self):
+        return SqliteValuesView(self)
+
+    def getLangs(self):
+        """Returns the sorted distinct languages of the records."""
+        return [ row[0] for row in self.conn.execute("SELECT DISTINCT lang FROM %s ORDER BY lang" % self.table) ]
+
+
+def getArtifactViews(conn):
+    """Returns the view of each table of the artifact store, by table name."""
+    return { table: SqliteRecordDict(conn, table) for table in ARTIFACT_TABLES }
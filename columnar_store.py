@@ -0,0 +1,269 @@
+import os
+import json
+import mmap
+import hashlib
+import functools
+from array import array
+from collections.abc import Mapping, ItemsView, ValuesView
+import numpy as np
+import ds
+
+
+COLUMNAR_MAGIC = b"DBYCOL1\n"
+ARRAY_ALIGNMENT = 64   # byte alignment of each array in the file
+VALUE_CACHE_SIZE = 4096    # values kept in the LRU cache of a store
+STRING_CACHE_SIZE = 65536  # decoded strings kept in the LRU cache of a store
+
+# numpy dtype of each kind of field; an "intlist" field, a list, tuple or
+# array('q') of ints, is stored as the concatenated values plus the
+# offsets of each record. In a field holding both ints and lists of
+# ints, such as DByDefRecord.lineNumList, the ints are stored as lists
+# of one; the lists are read back as a tuple, or an int for a list of one.
+FIELD_DTYPES = { "str": np.int32, "int": np.int64, "float": np.float64, "intlist": np.int64 }
+
+
+def keyHash(key):
+    """Returns the 64-bit hash of a key, used to look it up in a store."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def getFieldKind(value):
+    if isinstance(value, (str, bytes)):
+        return "str"
+    if isinstance(value, bool):
+        raise TypeError("Unsupported field value: "+repr(value))
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, array) and value.typecode == 'q' or \
+       isinstance(value, (list, tuple)) and all( isinstance(x, int) for x in value ):
+        return "intlist"
+    raise TypeError("Unsupported field value: "+repr(value))
+
+
+def getColumnKind(field, column):
+    """Returns the kind of the values of a field, ints and lists of ints being intlist."""
+    kinds = set(map(getFieldKind, column))
+    if kinds == {"int", "intlist"}:
+        return "intlist"
+    if len(kinds) > 1:
+        raise TypeError("Field %s holds values of kinds %s" % (field, ", ".join(sorted(kinds))))
+    return kinds.pop()
+
+
+def getIntList(values):
+    return values[0] if len(values) == 1 else tuple(values)
+
+
+class StringTableBuilder:
+    """Assigns an id to each distinct string, and packs them in one blob."""
+
+    def __init__(self):
+        self.dictIds = {}
+        self.encoded = []
+
+    def add(self, string):
+        if isinstance(string, bytes):
+            string = string.hex()   # binary keys are stored in their hex form
+        strId = self.dictIds.get(string)
+        if strId is None:
+            strId = len(self.encoded)
+            self.dictIds[string] = strId
+            self.encoded.append(string.encode('utf-8'))
+        return strId
+
+    def arrays(self):
+        offsets = np.zeros(len(self.encoded)+1, dtype=np.int64)
+        np.cumsum([ len(s) for s in self.encoded ], out=offsets[1:])
+        return np.frombuffer(b"".join(self.encoded), dtype=np.uint8), offsets
+
+
+def dumpColumnar(dictToSave, fileName):
+    """
+    Saves a dictionary of records, or of lists of records, of one of
+    the namedtuple types of ds in a single columnar file: one array
+    per field over all the records, the strings in a shared table,
+    the keys in their original order, and the key hashes sorted for
+    lookup. Binary keys and fields, such as the defkeys, are stored in
+    their hex form. The file is written under a temporary name and renamed,
+    so that the stores opened on the previous file stay valid.
+    """
+    keys = [ key.hex() if isinstance(key, bytes) else key for key in dictToSave ]
+    values = list(dictToSave.values())
+    isList = not values or isinstance(values[0], (list, ds.RecordBucket))
+    records = [ rec for recList in values for rec in recList ] if isList else values
+    rowOffsets = np.zeros(len(keys)+1, dtype=np.int64)
+    np.cumsum([ len(recList) if isList else 1 for recList in values ], out=rowOffsets[1:])
+
+    recordType = type(records[0]) if records else None
+    fields = list(recordType._fields) if recordType else []
+    kinds = [ getColumnKind(field, [ rec[i] for rec in records ]) for i, field in enumerate(fields) ]
+
+    strings = StringTableBuilder()
+    arrays = {}
+    arrays["keyIds"] = np.array([ strings.add(key) for key in keys ], dtype=np.int32)
+    hashes = np.array([ keyHash(key) for key in keys ], dtype=np.uint64)
+    arrays["keyOrder"] = np.argsort(hashes, kind="stable").astype(np.int64)
+    arrays["keyHashes"] = hashes[arrays["keyOrder"]]
+    arrays["rowOffsets"] = rowOffsets
+    for i, (field, kind) in enumerate(zip(fields, kinds)):
+        column = [ rec[i] for rec in records ]
+        if kind == "str":
+            arrays[field] = np.array([ strings.add(x) for x in column ], dtype=np.int32)
+        elif kind == "intlist":
+            column = [ [x] if isinstance(x, int) else x for x in column ]
+            listOffsets = np.zeros(len(column)+1, dtype=np.int64)
+            np.cumsum([ len(x) for x in column ], out=listOffsets[1:])
+            arrays[field] = np.array([ x for xs in column for x in xs ], dtype=np.int64)
+            arrays[field+".offsets"] = listOffsets
+        else:
+            arrays[field] = np.array(column, dtype=FIELD_DTYPES[kind])
+    arrays["strBlob"], arrays["strOffsets"] = strings.arrays()
+
+    header = { "recordType": recordType.__name__ if recordType else None,
+               "isList": isList, "fields": fields, "kinds": kinds, "arrays": {} }
+    # the header holds the position of each array, which depends on the header length
+    headerLen = 0
+    while True:
+        offset = len(COLUMNAR_MAGIC) + 8 + headerLen
+        for name, arr in arrays.items():
+            offset += -offset % ARRAY_ALIGNMENT
+            header["arrays"][name] = [ arr.dtype.str, len(arr), offset ]
+            offset += arr.nbytes
+        headerBytes = json.dumps(header).encode('utf-8')
+        if len(headerBytes) <= headerLen:
+            break
+        headerLen = len(headerBytes) + 64
+
+    tmpFileName = fileName + ".tmp"
+    with open(tmpFileName, "wb") as f:
+        f.write(COLUMNAR_MAGIC)
+        f.write(headerLen.to_bytes(8, 'little'))
+        f.write(headerBytes.ljust(headerLen))
+        for name, arr in arrays.items():
+            f.write(b"\0" * (header["arrays"][name][2] - f.tell()))
+            f.write(arr.tobytes())
+    os.replace(tmpFileName, fileName)
+    return fileName
+
+
+class ColumnarItemsView(ItemsView):
+    def __iter__(self):
+        store = self._mapping
+        for i in range(len(store)):
+            yield store.getKey(i), store.getValue(i)
+
+
+class ColumnarValuesView(ValuesView):
+    def __iter__(self):
+        store = self._mapping
+        for i in range(len(store)):
+            yield store.getValue(i)
+
+
+class ColumnarDict(Mapping):
+    """
+    Read-only dictionary view over a file saved by dumpColumnar. The
+    file is memory-mapped, and its arrays are zero-copy numpy views;
+    the records of a key are only built when the key is accessed, and
+    kept in a bounded LRU cache; lists of records are returned as
+    RecordBuckets. Iteration follows the original key order.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        with open(fileName, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(COLUMNAR_MAGIC)] != COLUMNAR_MAGIC:
+            raise ValueError("Not a columnar store: "+fileName)
+        headerStart = len(COLUMNAR_MAGIC) + 8
+        headerLen = int.from_bytes(self.mm[len(COLUMNAR_MAGIC):headerStart], 'little')
+        header = json.loads(self.mm[headerStart:headerStart+headerLen].decode('utf-8'))
+        self.arrays = { name: np.frombuffer(self.mm, dtype=np.dtype(dtype), count=count, offset=offset)
+                        for name, (dtype, count, offset) in header["arrays"].items() }
+        self.recordType = getattr(ds, header["recordType"]) if header["recordType"] else None
+        self.isList = header["isList"]
+        self.fields = list(zip(header["fields"], header["kinds"]))
+        self.keyIds = self.arrays["keyIds"]
+        self.keyHashes = self.arrays["keyHashes"]
+        self.keyOrder = self.arrays["keyOrder"]
+        self.rowOffsets = self.arrays["rowOffsets"]
+        self.strBlob = self.arrays["strBlob"]
+        self.strOffsets = self.arrays["strOffsets"]
+        self.strBase = header["arrays"]["strBlob"][2]   # file offset of the string blob
+        self.getString = functools.lru_cache(maxsize=STRING_CACHE_SIZE)(self.decodeString)
+        self.getValue = functools.lru_cache(maxsize=VALUE_CACHE_SIZE)(self.readValue)
+
+    def __reduce__(self):
+        return (ColumnarDict, (self.fileName,))
+
+    def __len__(self):
+        return len(self.keyIds)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.getKey(i)
+
+    def __getitem__(self, key):
+        i = self.findKey(key)
+        if i < 0:
+            raise KeyError(key)
+        return self.getValue(i)
+
+    def __contains__(self, key):
+        return self.findKey(key) >= 0
+
+    def items(self):
+        return ColumnarItemsView(self)
+
+    def values(self):
+        return ColumnarValuesView(self)
+
+    def column(self, field):
+        """Returns the zero-copy array of a field over all the records."""
+        return self.arrays[field]
+
+    def decodeString(self, strId):
+        start = self.strBase + int(self.strOffsets[strId])
+        end = self.strBase + int(self.strOffsets[strId+1])
+        return self.mm[start:end].decode('utf-8')
+
+    def getKey(self, i):
+        return self.getString(int(self.keyIds[i]))
+
+    def findKey(self, key):
+        """Returns the index of the key in the original order, or -1."""
+        if not isinstance(key, str):
+            return -1
+        h = np.uint64(keyHash(key))
+        pos = int(np.searchsorted(self.keyHashes, h))
+        while pos < len(self.keyHashes) and self.keyHashes[pos] == h:
+            i = int(self.keyOrder[pos])
+            if self.getKey(i) == key:
+                return i
+            pos += 1
+        return -1
+
+    def getRecords(self, start, end):
+        columns = []
+        for field, kind in self.fields:
+            arr = self.arrays[field]
+            if kind == "str":
+                columns.append([ self.getString(x) for x in arr[start:end].tolist() ])
+            elif kind == "intlist":
+                listOffsets = self.arrays[field+".offsets"][start:end+1].tolist()
+                columns.append([ getIntList(arr[listOffsets[j]:listOffsets[j+1]].tolist()) for j in range(end-start) ])
+            else:
+                columns.append(arr[start:end].tolist())
+        return [ self.recordType._make(values) for values in zip(*columns) ]
+
+    def readValue(self, i):
+        start = int(self.rowOffsets[i]); end = int(self.rowOffsets[i+1])
+        records = self.getRecords(start, end)
+        return ds.RecordBucket(records) if self.isList else records[0]
+
+
+def loadColumnar(fileName):
+    """Opens a columnar store as a read-only dictionary view."""
+    return ColumnarDict(fileName)
@@ -0,0 +1,356 @@
+import bz2
+import re
+import mmap
+import concurrent.futures
+from ds import DByRecord, DByReadPosition
+
+
+READ_BLOCK_SIZE = 4*1024*1024   # bytes of decompressed data read at a time
+
+BZ2_BLOCK_MAGIC = 0x314159265359   # 48-bit magic starting each bz2 block
+BZ2_EOS_MAGIC = 0x177245385090     # 48-bit magic ending each bz2 stream
+BZ2_STREAM_HEADER = b"BZh9"        # largest block size, valid for any block
+
+# one or more blank lines following the end of a line
+BLANK_RUN_RE = re.compile(rb"\n(?:[ \t\r\f\v]*\n)+")
+# blank lines at the start of the data
+LEADING_BLANKS_RE = re.compile(rb"(?:[ \t\r\f\v]*\n)+")
+# a line made of whitespace, including the non-ASCII whitespace of str.strip()
+UNICODE_BLANK_LINE_RE = re.compile(rb"(?m)^(?:[ \t\r\f\v\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80|"
+                                   rb"\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)+$")
+
+
+def iterFileBlocks(filePath, blockSize=READ_BLOCK_SIZE, startOffset=0):
+    """
+    Yields the decompressed content of a bz2 file in binary blocks,
+    as (blockBit, blockOffset, block) with blockBit None, since the
+    blocks read do not match the bz2 blocks, and blockOffset the
+    offset of the block in the decompressed stream. The content before
+    startOffset is decompressed but not yielded.
+    """
+    with bz2.open(filePath, 'rb') as inputFile:
+        blockOffset = 0
+        block = inputFile.read(blockSize)
+        while block:
+            if blockOffset + len(block) > startOffset:
+                skipped = max(startOffset - blockOffset, 0)
+                yield None, blockOffset + skipped, block[skipped:]
+            blockOffset += len(block)
+            block = inputFile.read(blockSize)
+
+
+def findBitPattern(data, pattern, numBits=48):
+    """
+    Returns the bit offsets of all the occurrences of a bit pattern
+    in data, at any bit alignment. The bytes fully covered by the
+    pattern are searched for with bytes.find, then the bits of the
+    partially covered bytes at each end are checked.
+    """
+    bitOffsets = []
+    for shift in range(8):
+        numBytes = (shift + numBits + 7) // 8
+        tailBits = numBytes*8 - shift - numBits
+        shifted = (pattern << tailBits).to_bytes(numBytes, 'big')
+        headMask = 0xFF >> shift
+        tailMask = (0xFF << tailBits) & 0xFF
+        middleStart = 1 if shift else 0
+        middleEnd = numBytes-1 if tailBits else numBytes
+        middle = shifted[middleStart:middleEnd]
+        pos = data.find(middle)
+        while pos != -1:
+            byteIndx = pos - middleStart
+            if byteIndx >= 0 and byteIndx + numBytes <= len(data):
+                if (not shift or (data[byteIndx] & headMask) == (shifted[0] & headMask)) and \
+                   (not tailBits or (data[byteIndx+numBytes-1] & tailMask) == (shifted[-1] & tailMask)):
+                    bitOffsets.append(byteIndx*8 + shift)
+            pos = data.find(middle, pos+1)
+    return sorted(bitOffsets)
+
+
+def findBz2Blocks(data):
+    """
+    Returns the (startBit, endBit, isBlock) ranges between the successive
+    block and end-of-stream magics of a bz2 file, isBlock telling whether
+    the range starts at a block magic. A block runs from its block magic
+    to the next magic of either kind, unless that magic was found by
+    chance inside its compressed data; a block magic after the last
+    end-of-stream magic starts a range running to the end of the file.
+    This works on multi-stream files too.
+    """
+    marks = sorted([ (bitOffset, True) for bitOffset in findBitPattern(data, BZ2_BLOCK_MAGIC) ] +
+                   [ (bitOffset, False) for bitOffset in findBitPattern(data, BZ2_EOS_MAGIC) ])
+    blockRanges = [ (marks[i][0], marks[i+1][0], marks[i][1]) for i in range(len(marks)-1) ]
+    if marks and marks[-1][1]:
+        blockRanges.append((marks[-1][0], len(data)*8, True))
+    return blockRanges
+
+
+def readBits(data, bitOffset, numBits):
+    """Returns the unsigned int held by numBits bits of data from bitOffset."""
+    chunk, startBit, endBit = getBlockChunk(data, bitOffset, bitOffset+numBits)
+    return (int.from_bytes(chunk, 'big') >> (len(chunk)*8 - endBit)) & ((1 << numBits) - 1)
+
+
+def isBz2FileEnd(data, blockRanges):
+    """Tells whether the last block range ends at the end-of-stream magic
+    ending a bz2 file: followed by the 32-bit stream CRC and the padding
+    to a whole byte."""
+    return 0 <= len(data)*8 - (blockRanges[-1][1] + 80) < 8
+
+
+def checkStreamCrc(data, eosBit, streamCrc):
+    """Raises an OSError if the CRC following an end-of-stream magic is not streamCrc."""
+    if streamCrc != readBits(data, eosBit+48, 32):
+        raise OSError("Invalid bz2 stream CRC at bit offset %d" % eosBit)
+
+
+def combineStreamCrc(streamCrc, blockCrc):
+    """Adds a block CRC to the CRC of its bz2 stream."""
+    return (((streamCrc << 1) | (streamCrc >> 31)) & 0xFFFFFFFF) ^ blockCrc
+
+
+def decompressBz2Block(chunk, startBit, endBit):
+    """
+    Decompresses one bz2 block, given the bytes holding it and its bit
+    range relative to the start of chunk. The block bits are realigned
+    into a single-block stream, closed by the end-of-stream magic and
+    the stream CRC, which is the block CRC for a single block.
+    """
+    numBits = endBit - startBit
+    chunkBits = len(chunk)*8
+    blockBits = (int.from_bytes(chunk, 'big') >> (chunkBits - endBit)) & ((1 << numBits) - 1)
+    blockCrc = (blockBits >> (numBits - 80)) & 0xFFFFFFFF
+    streamBits = (((blockBits << 48) | BZ2_EOS_MAGIC) << 32) | blockCrc
+    numStreamBits = numBits + 80
+    padBits = -numStreamBits % 8
+    stream = BZ2_STREAM_HEADER + (streamBits << padBits).to_bytes((numStreamBits+padBits)//8, 'big')
+    return bz2.decompress(stream)
+
+
+def getBlockChunk(data, startBit, endBit):
+    """Returns the bytes holding a bit range and the range relative to them."""
+    byteStart = startBit // 8
+    byteEnd = (endBit + 7) // 8
+    return data[byteStart:byteEnd], startBit - byteStart*8, endBit - byteStart*8
+
+
+def iterParallelBz2Blocks(filePath, numWorkers, startBit=None, startOffset=0):
+    """
+    Yields the decompressed content of a bz2 file block by block, in
+    file order, decompressing the blocks concurrently in a process
+    pool. A block range that fails to decompress, because a magic was
+    found by chance inside the compressed data, is merged with the
+    following ranges until it decompresses; if it never does, the rest
+    of the file is decompressed sequentially. The file must end with an
+    end-of-stream magic, and the CRC of each stream read from its first
+    block is checked against the CRCs of its blocks. Each block is yielded as
+    (blockBit, blockOffset, block), where blockBit is its bit offset
+    in the file, or None once decompressed sequentially. With startBit,
+    the blocks before the one at that bit offset are skipped, and
+    startOffset is the offset of that block in the decompressed stream.
+    """
+    with open(filePath, 'rb') as inputFile, \
+         mmap.mmap(inputFile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        blockRanges = findBz2Blocks(data)
+        if blockRanges and not isBz2FileEnd(data, blockRanges):
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+        if startBit is not None:
+            starts = [ blockRange[0] for blockRange in blockRanges ]
+            if startBit not in starts or not blockRanges[starts.index(startBit)][2]:
+                raise ValueError("No bz2 block at bit offset %d" % startBit)
+            blockRanges = blockRanges[starts.index(startBit):]
+        elif sum( 1 for blockRange in blockRanges if blockRange[2] ) <= 1:
+            yield from iterFileBlocks(filePath)
+            return
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers)
+        try:
+            futures = {}
+            maxPending = numWorkers*2
+            nextSubmit = 0
+            blockOffset = startOffset
+            streamCrc = 0 if startBit is None else None   # unknown for a stream read from one of its blocks
+            i = 0
+            while i < len(blockRanges):
+                while nextSubmit < len(blockRanges) and nextSubmit < i + maxPending:
+                    if blockRanges[nextSubmit][2]:
+                        futures[nextSubmit] = executor.submit(decompressBz2Block,
+                                                              *getBlockChunk(data, *blockRanges[nextSubmit][:2]))
+                    nextSubmit += 1
+                if not blockRanges[i][2]:
+                    # end of a stream: stream CRC, padding and the next stream header
+                    if streamCrc is not None:
+                        checkStreamCrc(data, blockRanges[i][0], streamCrc)
+                    streamCrc = 0
+                    i += 1
+                    continue
+                blockBit = blockRanges[i][0]
+                try:
+                    block = futures.pop(i).result()
+                    i += 1
+                except (OSError, EOFError, ValueError):
+                    merged = decompressMergedRanges(data, blockRanges, i, futures)
+                    if merged is None:
+                        yield from iterFileBlocks(filePath, startOffset=blockOffset)
+                        return
+                    block, i = merged
+                if streamCrc is not None:
+                    streamCrc = combineStreamCrc(streamCrc, readBits(data, blockBit+48, 32))
+                yield blockBit, blockOffset, block
+                blockOffset += len(block)
+            if streamCrc is not None:
+                checkStreamCrc(data, blockRanges[-1][1], streamCrc)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def decompressMergedRanges(data, blockRanges, i, futures):
+    """
+    Decompresses the block range i merged with as many following
+    ranges, of either kind, as needed. Returns the content and the next
+    range index, or None if no merged range decompresses, such as when
+    it spans two blocks, whose CRCs do not make up a single-block stream.
+    """
+    for last in range(i+1, len(blockRanges)):
+        futures.pop(last, None)
+        try:
+            return decompressBz2Block(*getBlockChunk(data, blockRanges[i][0], blockRanges[last][1])), last+1
+        except (OSError, EOFError, ValueError):
+            continue
+    return None
+
+
+class DByRecordReader:
+    """
+    Splits the decompressed DBnary Turtle stream into records. The
+    stream is consumed in large binary blocks and split on blank lines
+    with compiled patterns, so that only the records, and not the
+    lines, go through the Python loop. A record is a run of non-blank
+    lines whose first line starts with one of the record prefixes; it
+    is yielded as a DByRecord holding its first line number and its
+    stripped lines. A line in front of a record, which does not start
+    with a prefix, is yielded on its own with an empty prefix.
+
+    Records that are not needed are yielded with no lines, without
+    being decoded: those starting with one of skipPrefixes, and, when
+    recordTypes is given, those whose header (first two lines) names
+    none of recordTypes.
+
+    After a record is read, resumePoint holds the DByReadPosition from
+    which reading can resume after it, or None if the record is not the
+    last one of its run of lines.
+    """
+
+    def __init__(self, prefixes, skipPrefixes=(), recordTypes=None):
+        self.prefixes = tuple(prefixes)
+        self.bytePrefixes = tuple( p.encode('utf-8') for p in self.prefixes )
+        self.skipPrefixes = tuple( p.encode('utf-8') for p in skipPrefixes )
+        self.recordTypes = None
+        if recordTypes is not None:
+            self.recordTypes = tuple( t.encode('utf-8') for t in recordTypes )
+        self.lineCount = 0    # number of lines read so far
+        self.resumePoint = None
+
+    def iterFile(self, filePath, blockSize=READ_BLOCK_SIZE, numWorkers=1, resumePoint=None):
+        """
+        Yields the records of a bz2 compressed dump. With numWorkers > 1,
+        the bz2 blocks are decompressed concurrently by that many processes.
+        With resumePoint, reading starts from that DByReadPosition; when
+        its bz2 block is known, the blocks before it are not decompressed.
+        """
+        startOffset = 0; startLineNum = 1
+        if resumePoint is not None:
+            startOffset = resumePoint.offset; startLineNum = resumePoint.lineNum
+        if resumePoint is not None and resumePoint.blockBit is not None:
+            blocks = iterParallelBz2Blocks(filePath, numWorkers, resumePoint.blockBit, resumePoint.blockOffset)
+        elif numWorkers > 1:
+            blocks = iterParallelBz2Blocks(filePath, numWorkers)
+        else:
+            blocks = iterFileBlocks(filePath, blockSize)
+        return self.iterRecords(blocks, startOffset, startLineNum)
+
+    def iterRecords(self, blocks, startOffset=0, startLineNum=1):
+        """
+        Yields the records found in an iterable of (blockBit, blockOffset,
+        block) binary blocks, starting from the stream offset startOffset,
+        at line startLineNum.
+        """
+        lineNum = startLineNum
+        carry = b""
+        carryOffset = startOffset
+        for blockBit, blockOffset, block in blocks:
+            if blockOffset + len(block) <= startOffset:
+                continue
+            if blockOffset < startOffset:
+                block = block[startOffset-blockOffset:]
+            data = carry + block if carry else block
+            dataOffset = carryOffset
+            pos = 0
+            leading = LEADING_BLANKS_RE.match(data)
+            if leading:
+                lineNum += leading.group().count(b"\n")
+                pos = leading.end()
+            for sep in BLANK_RUN_RE.finditer(data, pos):
+                records = list(self.splitParagraph(data[pos:sep.start()], lineNum))
+                lineNum += data.count(b"\n", pos, sep.end())
+                pos = sep.end()
+                # the separator ends in this block, so the position after it does too
+                self.resumePoint = None
+                if records:
+                    yield from records[:-1]
+                    self.resumePoint = DByReadPosition(dataOffset+pos, lineNum, blockBit, blockOffset)
+                    yield records[-1]
+            carry = data[pos:]
+            carryOffset = dataOffset + pos
+            self.lineCount = lineNum - 1
+        self.resumePoint = None
+        if carry:
+            yield from self.splitParagraph(carry, lineNum)
+            lineNum += carry.count(b"\n")
+            if not carry.endswith(b"\n"):
+                lineNum += 1
+        self.lineCount = lineNum - 1
+
+    def isSkipped(self, paragraph):
+        """Tells whether a run of lines is a single record that is not needed."""
+        if not paragraph.startswith(self.bytePrefixes):
+            return False
+        if not paragraph.startswith(self.skipPrefixes):
+            if self.recordTypes is None:
+                return False
+            lineEnd = paragraph.find(b"\n")
+            headerEnd = paragraph.find(b"\n", lineEnd+1) if lineEnd != -1 else -1
+            header = paragraph[:headerEnd] if headerEnd != -1 else paragraph
+            if any( recType in header for recType in self.recordTypes ):
+                return False
+        # lines made of non-ASCII whitespace would split it into several records
+        return UNICODE_BLANK_LINE_RE.search(paragraph) is None
+
+    def splitParagraph(self, paragraph, firstLineNum):
+        """Yields the records and stray lines of a run of lines."""
+        if self.isSkipped(paragraph):
+            prefix = next(p for p, b in zip(self.prefixes, self.bytePrefixes) if paragraph.startswith(b))
+            yield DByRecord(firstLineNum=firstLineNum, prefix=prefix, lines=())
+            return
+        rawLines = paragraph.decode('utf-8').split("\n")
+        lines = [ line.strip() for line in rawLines ]
+        if "" not in lines:
+            yield from self.splitRun(rawLines, lines, firstLineNum)
+            return
+        # lines made of non-ASCII whitespace also end a record
+        start = 0
+        for i, line in enumerate(lines):
+            if not line:
+                if i > start:
+                    yield from self.splitRun(rawLines[start:i], lines[start:i], firstLineNum+start)
+                start = i+1
+        if start < len(lines):
+            yield from self.splitRun(rawLines[start:], lines[start:], firstLineNum+start)
+
+    def splitRun(self, rawLines, lines, firstLineNum):
+        """Yields the stray lines, then the record, of a run of non-blank lines."""
+        for i, rawLine in enumerate(rawLines):
+            if rawLine.startswith(self.prefixes):
+                prefix = next(p for p in self.prefixes if rawLine.startswith(p))
+                yield DByRecord(firstLineNum=firstLineNum+i, prefix=prefix, lines=lines[i:])
+                return
+            yield DByRecord(firstLineNum=firstLineNum+i, prefix="", lines=[rawLine.rstrip()])
@@ -9,19 +9,42 @@ import gen_utils
 import logging
 import wordnet_read as wnparse
 import pickle
-import datetime
+import time
+import os
+import heapq
+import multiprocessing
+import concurrent.futures
+import numpy as np
+import lemma_vocab
+import sparse_align
+import dby_reader
+import def_keys
+import lemma_norm
+from lemma_norm import normLemma
 from ds import *
 
 
 """global data structures"""
-# data structures for storing extraction data
-dictTranslations = {}
+# data structures for storing extraction data; the translations are
+# added to the dictionaries for alignment as they are extracted, and
+# only their keys are kept
+translationKeys = set()
 dictLexEntries = {}
 dictSenses = {}
 dictSynonyms = {}
 
+# translations waiting for their lexical entry to be extracted, and
+# the sequence numbers of the translations added to dictWkDef, for the
+# order they would have if added in sequence
+dictParkedTrans = {}   # key is lexEntryKey; each record is a list of (seq, TranslationRecord)
+dictDefSeq = {}        # key is defkey; seq of the first translation of the defkey
+defKeyMemo = def_keys.DefKeyMemo()   # defkey of each (lang, headword, pos, gloss) extracted
+
 # data structures for re-organizing data for
-# wordnet-dbnary synset alignment
+# wordnet-dbnary synset alignment; while the dump is extracted, the lists
+# of dictWkTrans and dictWkSynm are dictionaries from their distinct
+# records (to their seq, for dictWkTrans), frozen into RecordBuckets once
+# the extraction is done
 dictWkTrans = {}    # key is defkey; each record is a list of translations
 dictWkDef = {}      # key is defkey; each record is a tuple
 dictWkSynm = {}     # key is defkey; each record is a synonym in the source language,
@@ -29,6 +52,7 @@ dictWkSynm = {}     # key is defkey; each record is a synonym in the source lang
 dictWnTrans = {}    # key is wncode; each record is a list of the lemmas/translations
                     # belonging to that synset (this represents the data from the
                     # wordnets.
+dictWnStats = {}    # counts of dictWnTrans by pos and language (see wordnet_read.getWnTransStats)
 
 # alignment data structures
 dictAlignments = {}   # key is tuple (wncode, defkey) - wordnet-synset-id, wikt-synset-id
@@ -41,25 +65,105 @@ DBY_LANG_CODES_FILENAME = "language_codes.txt"
 LANG_CODE_2CHAR = "en"
 LANG_CODE_3CHAR = "eng"
 posMap = { 'noun':'n', 'propernoun':'n', 'verb':'v', 'adjective':'a', 'adverb':'r'}
+ALIGN_SHARDS_PER_WORKER = 4   # shards per worker process in the parallel alignment
+DBY_CHECKPOINT_FILENAME = "dbyCheckpoint.p"
+CHECKPOINT_INTERVAL_SECS = 900   # time between two checkpoints of the DBnary extraction
+ENTRIES_CHECKPOINT_FORMAT = 3    # version of the state saved in the checkpoints of getEntries
 
 """global variables"""
 srcLangCode3ch = ""
 srcLangCode2ch = ""
 
+# interned lemma ids of dictWnTrans, dictWkSynm and dictWkTrans
+lemmaVocab = None
+wnLemmaTable = None
+wkLemmaTable = None
+
+# thresholds of the candidate alignments
+candThresholds = CandThresholds()
+
+# state of an alignment worker process
+workerAlignState = {}
+
 """loggers"""
 logger=None # general logger
 
+"""compiled patterns of the property value extractors"""
+TRANS_LANGUAGE_RE = re.compile(r'lexvo:(.*)\s+;')
+LEXINFO_POS_RE = re.compile(r'lexinfo:(\S+)\s+')
+SYNONYMS_RE = re.compile(r':\S+\s')
+SENSES_RE = re.compile(r'\S+:\S+\s')
+SENSE_DEFINITION_RE = re.compile(r'lemon:value\s+\"(.+)\"')
+MULTI_UNDERSCORE_RE = re.compile(r'_{2,}')
+# patterns depending on the source language code; see getSrcLangPatterns()
+srcLangPatterns = {}
+
+"""projection of the DBnary records; see setProjection()"""
+projectedPtyTables = {}   # key is record type; property table restricted to the projection
+recordExtractors = []     # (record type, extractor) of the record types in the projection
+
+
+
+
+def getSrcLangPatterns():
+    """Returns the compiled patterns for the prefixed names of the
+    source language, compiling them once per language code.
+    """
+    patterns = srcLangPatterns.get(srcLangCode3ch)
+    if patterns is None:
+        patterns = (re.compile(srcLangCode3ch+r":(\S+)\s+;"),   # dbnary:isTranslationOf
+                    re.compile(srcLangCode3ch+r":\S+"))          # rdf:object
+        srcLangPatterns[srcLangCode3ch] = patterns
+    return patterns
+
+
+def splitPtyLine(line):
+    """Splits a predicate/object line into the property name and
+    the property value string, with the whitespace runs of the
+    value collapsed to single spaces.
+    """
+    lineParts = line.split()
+    if not lineParts:
+        return "", ""
+    return lineParts[0], " ".join(lineParts[1:])
+
+
+def getQuotedLiteral(ptyValStr):
+    """Returns the string between the first and the last double
+    quotes of the property value, or None if there are not two
+    double quotes.
+    """
+    start = ptyValStr.find('"')
+    end = ptyValStr.rfind('"')
+    if start < end:
+        return ptyValStr[start+1:end]
+    return None
 
 
+def extractPtyValues(buffer, startIndx, ptyTable, firstLineNum):
+    """Extracts the property values of a record in a single pass
+    over its lines, from line startIndx. ptyTable maps each property
+    name to the field name and the extractor of its value; the
+    properties not in the table are skipped. Returns the dictionary
+    of extracted values by field name.
+    """
+    values = {}
+    for i in range(startIndx, len(buffer)):
+        ptyName, ptyValStr = splitPtyLine(buffer[i])
+        entry = ptyTable.get(ptyName)
+        if entry is not None:
+            fieldName, extractor = entry
+            values[fieldName] = extractor(ptyValStr, firstLineNum)
+    return values
+
 
 def getTransGloss(ptyValStr, lineNum):
     """Gets the short gloss from the dbnary:gloss property
     in a translation record.
     """
     # Gloss is found within double quotes.
-    result = re.search('\"(.*)\"', ptyValStr)
-    if result :
-        gloss = result.group(1)
+    gloss = getQuotedLiteral(ptyValStr)
+    if gloss is not None:
         return gloss
 
     logger.debug("Error: search pattern not found for dbnary:gloss: line %d+ ptyValStr: %s", lineNum, ptyValStr)
@@ -72,19 +176,17 @@ def getTransInfoItems(ptyValStr, lineNum):
     """
     # Search for string prefixed by source language code
     # String is suffixed by space and semi-colon.
-    pattern = srcLangCode3ch+":(\S+)\s+;"
-    result = re.search(pattern, ptyValStr)
+    result = getSrcLangPatterns()[0].search(ptyValStr)
     if result:
         extResult = result.group(1)
-        items = re.split("_{2,}", extResult)
+        items = MULTI_UNDERSCORE_RE.split(extResult)
         if len(items) == 3:
             headword = items[0]
             pos = items[1]
             id = items[2]    # Note: changed the data type of id from int to str
             srcLexEntryKey = srcLangCode3ch+":"+extResult
             return srcLexEntryKey, headword, pos, id
-    httpResult = re.search("<http:", ptyValStr)
-    if httpResult:
+    if "<http:" in ptyValStr:
         logger.debug("Warning: ptyValStr at line %d+ is a URL: %s", lineNum, ptyValStr)
     else:
         logger.debug("Error in splitting ptyValStr at line %d+ ptyValStr:%s", lineNum, ptyValStr)
@@ -96,8 +198,7 @@ def getTransUsage(ptyValStr, lineNum):
        from the dbnary:usage property of the Translation record.
     """
     # String is found between double quotes.
-    result = re.search('\"(.*)\"', ptyValStr)
-    extResult = result.group(1)
+    extResult = getQuotedLiteral(ptyValStr)
     if extResult:
         return extResult
     logger.debug("Error: search pattern not found for dbnary:usage: line %d+ ptyValStr: %s", lineNum, ptyValStr)
@@ -108,11 +209,9 @@ def getTransWrittenForm(ptyValStr, lineNum):
     """Gets the writtenForm info from the dbnary:writtenForm property value field
     of the Translation record."""
     # String is found between double quotes
-    result = re.search('\"(.*)\"', ptyValStr)
-    if result :
-        extResult = result.group(1)
-        if extResult :
-            return extResult
+    extResult = getQuotedLiteral(ptyValStr)
+    if extResult :
+        return extResult
     logger.debug("Error: search pattern not found for dbnary:writtenForm: line %d+ ptyValStr: %s", lineNum, ptyValStr)
     return ""
 
@@ -122,9 +221,9 @@ def getTransLanguage(ptyValStr, lineNum):
     property of the Translation record
     """
     # target language is prefixed by lexvo:
-    result = re.search('lexvo:(.*)\s+;', ptyValStr)
-    extResult = result.group(1)
-    if extResult :
+    result = TRANS_LANGUAGE_RE.search(ptyValStr)
+    if result and result.group(1) :
+        extResult = result.group(1)
         return extResult
     logger.debug("Error: search pattern not found for dbnary:targetLanguage: line %d+ ptyValStr: %s", lineNum, ptyValStr)
     return ""
@@ -132,35 +231,46 @@ def getTransLanguage(ptyValStr, lineNum):
 
 def getSHA1DefKey(langCode, word, pos, shortGloss):
     """returns the SHA1 hash for defkey made up of info items from a translation record:
-       language code, headword, POS, and short gloss"""
-    hashInpStr = langCode+"-"+word+"-"+pos+"-"+shortGloss
-    hashObject = hashlib.sha1( hashInpStr.encode(encoding='utf-8') )
-    hashkey = hashObject.hexdigest()
-    return hashkey
+       language code, headword, POS, and short gloss. The defkey is the 20-byte
+       digest; it is exported in its hex form (see def_keys)"""
+    return defKeyMemo.getKey(langCode, word, pos, shortGloss)
 
 
 def saveTransRecord(key, srcLexEntryKey, headword, pos, tgtLangCode, gloss, lexId, usage, writtenForm, firstLineNum):
-    """save a translation record in dictionary, with record key being the SHA1 hash of
-       info items of the record: target language code, headword, POS, short gloss"""
-    global dictTranslations
+    """add a translation record to the dictionaries for alignment, or park it
+       until its lexical entry is extracted; the record key is the DBnary key"""
+    global translationKeys
     global srcLangCode3ch
 
     if not key :
         logger.debug("Error: Key is null: line %d+", firstLineNum)
         return None
-    if key in dictTranslations.keys():
-       logger.debug("Error: Translation key found: key:%s lineNumList:%s", key, dictTranslations[key].lineNum)
+    if key in translationKeys:
+       logger.debug("Error: Translation key found: key:%s line:%d+", key, firstLineNum)
     else:
-       rec = TranslationRecord(srcLexEntryKey=srcLexEntryKey,
-                               headword=headword, pos=pos,
-                               srcLangCode=srcLangCode3ch, tgtLangCode=tgtLangCode,
-                               gloss=gloss, lexId=lexId,
+       seq = len(translationKeys)
+       translationKeys.add(key)
+       # the fields shared by the translations of a lexical entry sense are interned
+       rec = TranslationRecord(srcLexEntryKey=sys.intern(srcLexEntryKey),
+                               headword=sys.intern(headword), pos=sys.intern(pos),
+                               srcLangCode=srcLangCode3ch, tgtLangCode=sys.intern(tgtLangCode),
+                               gloss=sys.intern(gloss), lexId=sys.intern(lexId),
                                writtenForm=writtenForm, usage=usage,
-                               lineNum=firstLineNum,
-                               disambSenseList=[])
-       dictTranslations[key] = rec
+                               lineNum=firstLineNum)
+       if srcLexEntryKey in dictLexEntries:
+           saveWkTranslation(seq, rec)
+       else:
+           dictParkedTrans.setdefault(rec.srcLexEntryKey, []).append((seq, rec))
+
+
 
 
+# properties extracted from a dbnary:Translation record
+TRANS_PTY_TABLE = { "dbnary:gloss": ("gloss", getTransGloss),
+                    "dbnary:isTranslationOf": ("transInfo", getTransInfoItems),
+                    "dbnary:targetLanguage": ("tgtLang", getTransLanguage),
+                    "dbnary:usage": ("usage", getTransUsage),
+                    "dbnary:writtenForm": ("writtenForm", getTransWrittenForm) }
 
 
 def extractTranslation(buffer, firstLineNum):
@@ -183,38 +293,29 @@ def extractTranslation(buffer, firstLineNum):
 
         transKey = buffer[0].strip()   # DBnary "key" for the translation
         if transKey :
-            for i in range(2, len(buffer)): #range(1, len(buffer)):
-                line = buffer[i].strip()
-                lineParts = re.split("\s+", line)
-                ptyName = lineParts[0]
-                ptyValStr = " ".join(lineParts[1:])
-                if ptyName == "dbnary:gloss":
-                    gloss = getTransGloss(ptyValStr, firstLineNum )
-                elif ptyName=="dbnary:isTranslationOf":
-                    srcLexEntryKey, headword, pos, lexId = getTransInfoItems(ptyValStr, firstLineNum)
-                elif ptyName=="dbnary:targetLanguage":
-                    tgtLang = getTransLanguage(ptyValStr, firstLineNum)
-                elif ptyName=="dbnary:usage":
-                    usage = getTransUsage(ptyValStr, firstLineNum)
-                elif ptyName=="dbnary:writtenForm":
-                    writtenForm = getTransWrittenForm(ptyValStr, firstLineNum)
+            values = extractPtyValues(buffer, 2, projectedPtyTables["dbnary:Translation"], firstLineNum)
+            gloss = values.get("gloss", gloss)
+            srcLexEntryKey, headword, pos, lexId = values.get("transInfo", (srcLexEntryKey, headword, pos, lexId))
+            tgtLang = values.get("tgtLang", tgtLang)
+            usage = values.get("usage", usage)
+            writtenForm = values.get("writtenForm", writtenForm)
             saveTransRecord(transKey, srcLexEntryKey, headword, pos, tgtLang, gloss, lexId, usage, writtenForm, firstLineNum)
 
 
 def saveDByTransRecord(dictToSave, defkey, lemma, shortPos, tgtLang):
     """save a translation record as one item in a list of translations
-       addressed by defkey
+       addressed by defkey; the list is a dictionary of its distinct
+       records, in insertion order, until frozen by freezeRecordBuckets
        """
     newRec = WnDByTransRecord(ignore=0,
-                            lemma = lemma,
+                            lemma = sys.intern(lemma),
                             pos=shortPos,
-                            lang = tgtLang )
-    if defkey not in dictToSave.keys():
-        newList = [newRec]
-        dictToSave[defkey]=newList
-    else:
-        if newRec not in dictToSave[defkey]:
-            dictToSave[defkey].append(newRec)
+                            lang = sys.intern(tgtLang) )
+    bucket = dictToSave.get(defkey)
+    if bucket is None:
+        dictToSave[defkey] = {newRec: None}
+    elif newRec not in bucket:
+        bucket[newRec] = None
 
 
 def getShortPosHeadword(lexEntryKey):
@@ -242,39 +343,101 @@ def saveDByDefRecord(defkey, srcLangCode, word, shortPos, glossDef, longPos, lin
                                 pos=shortPos, longPos=longPos,
                                 gloss=glossDef,
                                 longDef="",
-                                lineNumList=[lineNum])
+                                lineNumList=lineNum)
         dictWkDef[defkey] = newRec
     else:
-        record = dictWkDef[defkey]
-        numList = record.lineNumList
-        numList.append(lineNum)
-        dictWkDef[defkey] = record._replace(lineNumList=numList)
+        rec = dictWkDef[defkey]
+        dictWkDef[defkey] = rec._replace(lineNumList=getLineNums(rec.lineNumList) + (lineNum,))
 
 
-def normLemma(lemma):
-    """ Normalize lemma for purpose of comparison.
+def saveWkTranslation(seq, v):
+    """Adds the translation record v, number seq in the order of
+       extraction, to dictWkTrans, dictWkDef and dictWkSynm. The records
+       can be added in any order: the dictionaries are those obtained
+       by adding them in seq order, once restoreWkDefOrder is called.
+    """
+    global dictWkSynm, dictWkDef
+
+    shortPos, headword = getShortPosHeadword(v.srcLexEntryKey)
+    defkey = getSHA1DefKey(srcLangCode3ch, v.headword, shortPos, v.gloss)
+    insertWkTransRecord(defkey, seq, normLemma(v.writtenForm), shortPos, v.tgtLangCode)
+    firstSeq = dictDefSeq.get(defkey)
+    if firstSeq is None:
+        dictDefSeq[defkey] = seq
+        normHeadword = normLemma(v.headword)
+        saveDByDefRecord(defkey, srcLangCode3ch, normHeadword, shortPos, v.gloss,
+                         v.pos, v.lineNum )
+        saveDByTransRecord(dictWkSynm, defkey, normHeadword, shortPos, srcLangCode3ch)  # note: add src headword
+    elif seq < firstSeq:
+        # the definition is that of the first translation of the defkey
+        dictDefSeq[defkey] = seq
+        dictWkDef[defkey] = dictWkDef[defkey]._replace(longPos=v.pos, lineNumList=v.lineNum)
+
+
+def insertWkTransRecord(defkey, seq, lemma, shortPos, tgtLang):
+    """Adds a translation to the translations of defkey, a dictionary
+       from each distinct record to the lowest seq it was added with;
+       freezeRecordBuckets puts the records in seq order.
     """
-    nLemma = lemma.lower()
-    nLemma = re.sub(r"-|_|\(|\)|\[|\]", " ", nLemma)
-    nLemma = re.sub(r"\s+", " ", nLemma)
-    nLemma = nLemma.strip()
-    return nLemma
+    global dictWkTrans
+
+    newRec = WnDByTransRecord(ignore=0, lemma=sys.intern(lemma), pos=shortPos, lang=sys.intern(tgtLang))
+    bucket = dictWkTrans.get(defkey)
+    if bucket is None:
+        dictWkTrans[defkey] = {newRec: seq}
+        return
+    prevSeq = bucket.get(newRec)
+    if prevSeq is None or seq < prevSeq:
+        bucket[newRec] = seq
+
+
+def saveParkedTranslations(lexEntryKey):
+    """Adds the translations parked until lexEntryKey was extracted."""
+    for seq, rec in dictParkedTrans.pop(lexEntryKey, ()):
+        saveWkTranslation(seq, rec)
+
+
+def restoreWkDefOrder():
+    """Puts the defkeys of dictWkDef, dictWkTrans and dictWkSynm in the
+       order of their first translation, if translations were added out
+       of order, and releases the sequence numbers.
+    """
+    global dictWkTrans, dictWkSynm, dictWkDef, dictDefSeq
+
+    seqs = list(dictDefSeq.values())
+    if any( seqs[i] > seqs[i+1] for i in range(len(seqs)-1) ):
+        defKeys = sorted(dictDefSeq, key=dictDefSeq.get)
+        dictWkDef = { defkey: dictWkDef[defkey] for defkey in defKeys }
+        dictWkTrans = { defkey: dictWkTrans[defkey] for defkey in defKeys }
+        dictWkSynm = { defkey: dictWkSynm[defkey] for defkey in defKeys }
+    dictDefSeq = {}
+
+
+def freezeRecordBuckets(dictBuckets):
+    """Freezes the record dictionaries of dictBuckets into RecordBuckets.
+       Records with seq values are put in seq order.
+    """
+    for key, bucket in dictBuckets.items():
+        seqs = list(bucket.values())
+        if seqs[0] is not None and any( seqs[i] > seqs[i+1] for i in range(len(seqs)-1) ):
+            dictBuckets[key] = RecordBucket(sorted(bucket, key=bucket.get))
+        else:
+            dictBuckets[key] = RecordBucket(bucket)
 
 
 def makeDByDictionaries():
-    global dictTranslations
+    """Completes the dictionaries for alignment once the extraction is
+       done: adds the translations whose lexical entry was not found,
+       then the synonyms, and releases the extracted records.
+    """
     global dictWkTrans, dictWkSynm, dictWkDef
-    global dictWnTrans
+    global dictLexEntries, dictSenses, dictSynonyms, dictParkedTrans, defKeyMemo
 
-    for k, v in dictTranslations.items():
-        shortPos, headword = getShortPosHeadword(v.srcLexEntryKey)
-        defkey = getSHA1DefKey(srcLangCode3ch, v.headword, shortPos, v.gloss)
-        saveDByTransRecord(dictWkTrans, defkey, normLemma(v.writtenForm), shortPos, v.tgtLangCode)
-        if defkey not in dictWkDef:
-            normHeadword = normLemma(v.headword)
-            saveDByDefRecord(defkey, srcLangCode3ch, normHeadword, shortPos, v.gloss,
-                             v.pos, v.lineNum )
-            saveDByTransRecord(dictWkSynm, defkey, normHeadword, shortPos, srcLangCode3ch)  # note: add src headword
+    parked = sorted( x for parkedList in dictParkedTrans.values() for x in parkedList )
+    dictParkedTrans = {}
+    for seq, v in parked:
+        saveWkTranslation(seq, v)
+    restoreWkDefOrder()
 
     for k, v in dictSynonyms.items():
         shortPos, headword = getShortPosHeadword(v.lexEntryKey)
@@ -285,27 +448,33 @@ def makeDByDictionaries():
             continue
         #defkey = getSHA1DefKey(srcLangCode3ch, v.word, shortPos, v.gloss)
         defkey = getSHA1DefKey(srcLangCode3ch, headword, shortPos, v.gloss)
-        saveDByTransRecord(dictWkSynm, defkey, normLemma(v.word), shortPos, srcLangCode3ch)
+        normWord = normLemma(v.word)
+        saveDByTransRecord(dictWkSynm, defkey, normWord, shortPos, srcLangCode3ch)
         if defkey not in dictWkDef:
-            normWord = normLemma(v.word)
             saveDByDefRecord(defkey, srcLangCode3ch, normWord, shortPos, v.gloss,
                              "", v.lineNum)
+    freezeRecordBuckets(dictWkTrans)
+    freezeRecordBuckets(dictWkSynm)
+
+    logger.info("Number of distinct defkey inputs of the synonyms and parked translations: %d", len(defKeyMemo))
+    dictLexEntries = {}; dictSenses = {}; dictSynonyms = {}
+    defKeyMemo = def_keys.DefKeyMemo()
 
 
 def normWnTrans():
+    """Normalizes the lemmas and POS of the wordnet translations."""
     global posMap
     global dictWnTrans
 
     posValues = posMap.values()
     for k, vlist in dictWnTrans.items():
-        normList = []
-        if vlist[0].pos not in posValues:
-            normList= [ v._replace(pos="?") for v in vlist]
-        if vlist[0].pos == "s":
-            normList = [ v._replace(pos="a") for v in vlist]
-
-        normList = [ v._replace(lemma=normLemma(v.lemma)) for v in vList]
-        dictWnTrans[k] = normList
+        pos = vlist[0].pos
+        if pos == "s":
+            pos = "a"
+        elif pos not in posValues:
+            pos = "?"
+        lemmas = lemma_norm.normLemmas([ v.lemma for v in vlist ])
+        dictWnTrans[k] = RecordBucket( v._replace(lemma=lemma, pos=pos) for v, lemma in zip(vlist, lemmas) )
 
 
 
@@ -325,8 +494,7 @@ def getLexEntryDBnaryPos(ptyValStr, firstLineNum):
     """Get the part of speech from dbnary:partOfSpeech field
     for the Lexical Entry"""
     # Search for the string within double quotes
-    result = re.search('\"(.*)\"', ptyValStr)
-    extResult = result.group(1)
+    extResult = getQuotedLiteral(ptyValStr)
     if extResult :
         pos = extResult    #extResult.lower()
         return pos
@@ -339,7 +507,7 @@ def getLexEntryLexinfoPos(ptyValStr, firstLineNum):
     """Gets the part of speech from lexinfo:partOfSpeech field
     for the Lexical Entry"""
     # Search for the string prefixed by lexinfo:
-    result = re.search('lexinfo:(\S+)\s+', ptyValStr)
+    result = LEXINFO_POS_RE.search(ptyValStr)
     if result:
         extResult = result.group(1)
         if extResult:
@@ -351,7 +519,7 @@ def getLexEntryLexinfoPos(ptyValStr, firstLineNum):
 def getLexEntitySynonyms(ptyValStr, firstLineNum):
     """Gets the synonyms from dbnary:synonym field from either
     LexicalSense or LexicalEntry record"""
-    finds = re.findall(':\S+\s', ptyValStr)
+    finds = SYNONYMS_RE.findall(ptyValStr)
 
     # Synonyms are prefixed by source language code followed by :
     # Here, we only look for the colon.
@@ -371,7 +539,7 @@ def getLexEntrySenses(ptyValStr, firstLineNum):
     """Gets the senses from lemon:sense field"""
     #finds = re.findall(':\S+\s', line)
     # note: the senses are separated by " ," and end with " ."
-    finds = re.findall('\S+:\S+\s', ptyValStr)
+    finds = SENSES_RE.findall(ptyValStr)
 
     if finds :  #not empty list
         #[(x, y) for x in [1,2,3] for y in [3,1,4] if x != y]
@@ -385,6 +553,14 @@ def getLexEntrySenses(ptyValStr, firstLineNum):
     return []
 
 
+def getLexEntrySynonyms(ptyValStr, firstLineNum):
+    """Gets the synonyms from dbnary:synonym field of a LexicalEntry
+    record, counting the entries with synonyms"""
+    global lexEntryWithSynCount
+    lexEntryWithSynCount += 1
+    return getLexEntitySynonyms(ptyValStr, firstLineNum)
+
+
 def saveLexEntryRec(key, lemma, lexinfoPos, dbPos, syns, senses):
     """Saves the lexicalEntry record in the dictionary"""
     global dictLexEntries
@@ -399,16 +575,17 @@ def saveLexEntryRec(key, lemma, lexinfoPos, dbPos, syns, senses):
                 # print("Synonyms present: key is: "+key)
                 logger.info("Synonyms found. LexEntry-key: %s Synonyms: %s", key, syns)
             dictLexEntries[key] = rec
+            saveParkedTranslations(key)
     else:
         logger.debug("Error: key is empty")
 
 
 def getLemmaFromLexEntryKey(key, firstLineNum):
     """Extracts the lemma for lexical entry from the key"""
-    parts = re.split("__+", key)
+    parts = MULTI_UNDERSCORE_RE.split(key)
     if parts: # len(parts) > 0 :
        #lemma = re.split(":", parts[0])[1]
-       subParts = re.split(":", parts[0])    # : separates lemma from source language code
+       subParts = parts[0].split(":")    # : separates lemma from source language code
        if len(subParts) > 1:
            lemma = subParts[1]
            return lemma
@@ -416,12 +593,18 @@ def getLemmaFromLexEntryKey(key, firstLineNum):
     return ""
 
 
+# properties extracted from a lemon:LexicalEntry record
+LEX_ENTRY_PTY_TABLE = { "dbnary:partOfSpeech": ("dbPos", getLexEntryDBnaryPos),
+                        "dbnary:synonym": ("syns", getLexEntrySynonyms),
+                        "lemon:sense": ("senses", getLexEntrySenses),
+                        "lexinfo:partOfSpeech": ("lexiPos", getLexEntryLexinfoPos) }
+
+
 def extractLexicalEntry(buffer, firstLineNum):
     """Extracts the record for a LexicalEntry, and
     stores it in dictionary.
     """
     global  lemonLexEntryCount
-    global   lexEntryWithSynCount
 
     if len(buffer) <= 1 :
         return None
@@ -430,21 +613,9 @@ def extractLexicalEntry(buffer, firstLineNum):
         lemonLexEntryCount += 1
         key = buffer[0].strip()
         lemma = getLemmaFromLexEntryKey(key, firstLineNum)
-        dbPos = ""; syns = []; senses=[]; lexiPos="";
-        for i in range(2, len(buffer)):   #range(1, len(buffer)):
-            line = buffer[i]
-            lineParts = re.split("\s+", line)
-            ptyName = lineParts[0].strip()
-            ptyValStr = " ".join(lineParts[1:])
-            if ptyName=="dbnary:partOfSpeech":
-                dbPos = getLexEntryDBnaryPos(ptyValStr, firstLineNum)
-            elif ptyName=="dbnary:synonym":
-                lexEntryWithSynCount += 1
-                syns = getLexEntitySynonyms(ptyValStr, firstLineNum)
-            elif ptyName=="lemon:sense":
-                senses = getLexEntrySenses(ptyValStr, firstLineNum)
-            elif ptyName=="lexinfo:partOfSpeech":
-                lexiPos = getLexEntryLexinfoPos(ptyValStr, firstLineNum)
+        values = extractPtyValues(buffer, 2, projectedPtyTables["lemon:LexicalEntry"], firstLineNum)
+        dbPos = values.get("dbPos", ""); syns = values.get("syns", [])
+        senses = values.get("senses", []); lexiPos = values.get("lexiPos", "")
         saveLexEntryRec(key, lemma, lexiPos, dbPos, syns, senses)
 
 
@@ -464,19 +635,17 @@ def getSenseKey(line, firstLineNum):
 def getSenseId(ptyValStr, firstLineNum):
     """Gets the id for the sense"""
     # search for id within double quotes
-    result = re.search('\"(.*)\"', ptyValStr)
-    if result:
-       extResult = result.group(1)
-       if extResult:
-           senseId = extResult.lower()
-           return senseId
+    extResult = getQuotedLiteral(ptyValStr)
+    if extResult:
+        senseId = extResult.lower()
+        return senseId
     logger.debug("Error: search pattern not found in line %d+ ptyValStr:%s", firstLineNum, ptyValStr)
     return ""
 
 def getSenseDefinition(ptyValStr, firstLineNum):
     """Gets the definition for the sense"""
     # Search for string within double quotes preceded by tag lemon:value
-    result = re.search('lemon:value\s+\"(.+)\"', ptyValStr)
+    result = SENSE_DEFINITION_RE.search(ptyValStr)
     if result:
         extResult = result.group(1)
         if extResult :
@@ -484,6 +653,14 @@ def getSenseDefinition(ptyValStr, firstLineNum):
     logger.debug("Error: search pattern not found in line %d+ ptyValStr:%s", firstLineNum, ptyValStr)
     return ""
 
+def getSenseSynonyms(ptyValStr, firstLineNum):
+    """Gets the synonyms from dbnary:synonym field of a LexicalSense
+    record, counting the senses with synonyms"""
+    global senseWithSynCount
+    senseWithSynCount += 1
+    return getLexEntitySynonyms(ptyValStr, firstLineNum)
+
+
 def saveSenseRec(key, lemma, senseId, syns, definition):
     """Saves the sense record in a dictionary"""
     global dictSenses
@@ -491,7 +668,7 @@ def saveSenseRec(key, lemma, senseId, syns, definition):
         if key in dictSenses.keys():
             logger.debug("Error: key is already found in dictSenses: key=%s", key)
         else:
-            rec = SenseRecord(lemma=lemma, senseId=senseId, synonymList=syns, definition=definition, disambTranslationList=[])
+            rec = SenseRecord(lemma=lemma, senseId=senseId, synonymList=syns, definition=definition)
             dictSenses[key] = rec
     else:
         logger.debug("Error: key is empty string.")
@@ -499,12 +676,12 @@ def saveSenseRec(key, lemma, senseId, syns, definition):
 
 def getLemmaFromSenseKey(key, firstLineNum):
     """Extracts the lemma from the sense key"""
-    parts = re.split("__+", key)
+    parts = MULTI_UNDERSCORE_RE.split(key)
     if len(parts) <= 1:
         lemma = ""
         logger.debug("Error: search pattern not found in line %d+ key:%s", firstLineNum, key)
     else:
-        subParts = re.split("_", parts[1])
+        subParts = parts[1].split("_")
         if len(subParts) > 3:
             lemma = "_".join(subParts[2:])
         elif len(subParts) == 3:
@@ -516,10 +693,15 @@ def getLemmaFromSenseKey(key, firstLineNum):
     return lemma
 
 
+# properties extracted from a lemon:LexicalSense record
+LEX_SENSE_PTY_TABLE = { "dbnary:senseNumber": ("senseId", getSenseId),
+                        "dbnary:synonym": ("syns", getSenseSynonyms),
+                        "lemon:definition": ("definition", getSenseDefinition) }
+
+
 def extractLexicalSense(buffer, firstLineNum):
     """Gets a sense record and stores it in a dictionary"""
     global lemonLexSenseCount
-    global senseWithSynCount #synsInWsCount
 
     if len(buffer) <= 1 :
         return None
@@ -529,19 +711,9 @@ def extractLexicalSense(buffer, firstLineNum):
         #key = getWdSenseKey(buffer[0], firstLineNum)
         key = buffer[0].strip()
         lemma = getLemmaFromSenseKey(key, firstLineNum)
-        senseId = ""; syns = []; definition="";
-        for i in range(2, len(buffer)): #range(1, len(buffer)):
-            line = buffer[i]
-            lineParts = re.split("\s+", line)
-            ptyName = lineParts[0]
-            ptyValStr = " ".join(lineParts[1:])
-            if ptyName == "dbnary:senseNumber":
-                senseId = getSenseId(ptyValStr, firstLineNum)
-            elif ptyName == "dbnary:synonym":
-                senseWithSynCount += 1  # synsInWsCount += 1
-                syns = getLexEntitySynonyms(ptyValStr, firstLineNum)
-            elif ptyName == "lemon:definition":
-                definition = getSenseDefinition(ptyValStr, firstLineNum)
+        values = extractPtyValues(buffer, 2, projectedPtyTables["lemon:LexicalSense"], firstLineNum)
+        senseId = values.get("senseId", ""); syns = values.get("syns", [])
+        definition = values.get("definition", "")
         saveSenseRec(key, lemma, senseId, syns, definition)
 
 
@@ -549,9 +721,9 @@ def getSynonymWord(ptyValStr, firstLineNum):
     """extracts the synonym word from the property value field,
     assuming that the property fieldname is rdf:object
     """
-    result = re.findall(srcLangCode3ch+":\S+", ptyValStr)
+    result = getSrcLangPatterns()[1].search(ptyValStr)
     if result:
-        word = result[0][len(srcLangCode3ch)+1:]
+        word = result.group(0)[len(srcLangCode3ch)+1:]
         return word
     logger.debug("Error: search pattern not found in line %d+ ptyValStr:%s", firstLineNum, ptyValStr)
     return ""
@@ -561,13 +733,17 @@ def getSynonymGloss(ptyValStr, firstLineNum):
     """The short gloss for the synonym is found between double quotes.
     Assumes that the ptyFieldName is dbnary:gloss
     """
-    result = re.search("\"(.*)\"", ptyValStr)
-    if result:
-        gloss = result.group(1)
+    gloss = getQuotedLiteral(ptyValStr)
+    if gloss is not None:
         return gloss.strip()
     logger.debug("Error: search pattern not found in line %d+ ptyValStr:%s", firstLineNum, ptyValStr)
     return ""
 
+def getSynonymSubject(ptyValStr, firstLineNum):
+    """Gets the key of the lexical entry from the rdf:subject field"""
+    return ptyValStr.split(" ")[0]
+
+
 def saveSynonymRec(key, synonym, lexEntryKey, synGloss, lineNum):
     """Saves the synonym record in the dictionary"""
     global dictSynonyms
@@ -577,46 +753,132 @@ def saveSynonymRec(key, synonym, lexEntryKey, synGloss, lineNum):
         logger.debug("Synonym value is missing.")
     if not lexEntryKey:
         logger.debug("LexEntryKey value is missing.")
-    newRec = SynonymRecord(word=synonym, lexEntryKey=lexEntryKey, gloss=synGloss, lineNum=lineNum)
+    newRec = SynonymRecord(word=synonym, lexEntryKey=sys.intern(lexEntryKey), gloss=sys.intern(synGloss), lineNum=lineNum)
     if key in dictSynonyms.keys():
         logger.debug("Error: synonym key %s is already found in dictSynonyms")
     else:
         dictSynonyms[key]= newRec
 
 
+# properties extracted from a synonym rdf:Statement record
+SYNONYM_PTY_TABLE = { "rdf:object": ("synonym", getSynonymWord),
+                      "rdf:subject": ("lexEntryKey", getSynonymSubject),
+                      "dbnary:gloss": ("synGloss", getSynonymGloss) }
+SYNONYM_PREDICATE_RE = re.compile(r"rdf:predicate\s+dbnary:synonym")
+
+
 def extractSynonymRelation(buf, firstLineNum):
     """Extracts the synonym relation"""
     global synonymRelationsCount
     global srcLangCode3ch
 
-    checkSynm = [ 1  for line in buf if re.search("rdf:predicate\s+dbnary:synonym", line) ]
+    checkSynm = any( SYNONYM_PREDICATE_RE.search(line) for line in buf )
     if checkSynm:
         synonymRelationsCount+=1
         key = buf[0].strip()
-        synonym=""; lexEntryKey=""; synGloss=""
-        for i in range(1, len(buf)):
-            line = buf[i]
-            lineParts = re.split("\s+", line)
-            ptyName = lineParts[0]
-            ptyValStr = " ".join(lineParts[1:])
-            if ptyName == "rdf:object":
-                synonym = getSynonymWord(ptyValStr, firstLineNum)
-            elif ptyName == "rdf:subject":
-                lexEntryKey = re.split("\s+", ptyValStr)[0]
-            elif ptyName == "dbnary:gloss":
-                synGloss = getSynonymGloss(ptyValStr, firstLineNum)
+        values = extractPtyValues(buf, 1, projectedPtyTables["rdf:Statement"], firstLineNum)
+        synonym = values.get("synonym", ""); lexEntryKey = values.get("lexEntryKey", "")
+        synGloss = values.get("synGloss", "")
         if synonym and lexEntryKey.startswith(srcLangCode3ch):
             saveSynonymRec(key, synonym, lexEntryKey, synGloss, firstLineNum)
 
 
-def getEntries(filePath, testNumLines=math.inf):
+# extractor and property table of each record type
+RECORD_EXTRACTORS = { "dbnary:Translation": (extractTranslation, TRANS_PTY_TABLE),
+                      "lemon:LexicalEntry": (extractLexicalEntry, LEX_ENTRY_PTY_TABLE),
+                      "lemon:LexicalSense": (extractLexicalSense, LEX_SENSE_PTY_TABLE),
+                      "rdf:Statement": (extractSynonymRelation, SYNONYM_PTY_TABLE) }
+
+# projections of the DBnary records: the record types to extract,
+# and the properties to extract for each of them
+FULL_PROJECTION = { recType: tuple(ptyTable) for recType, (_, ptyTable) in RECORD_EXTRACTORS.items() }
+# only what makeDByDictionaries needs to build the alignment inputs
+ALIGN_PROJECTION = { "dbnary:Translation": ("dbnary:gloss", "dbnary:isTranslationOf",
+                                            "dbnary:targetLanguage", "dbnary:writtenForm"),
+                     "lemon:LexicalEntry": ("lexinfo:partOfSpeech",),
+                     "rdf:Statement": ("rdf:object", "rdf:subject", "dbnary:gloss") }
+
+
+def setProjection(projection):
+    """Sets the record extractors and the property tables to those
+    of the projection.
+    """
+    global recordExtractors
+    recordExtractors = []
+    projectedPtyTables.clear()
+    for recType, ptyNames in projection.items():
+        extractRecord, ptyTable = RECORD_EXTRACTORS[recType]
+        projectedPtyTables[recType] = { ptyName: ptyTable[ptyName] for ptyName in ptyNames }
+        recordExtractors.append((recType, extractRecord))
+
+
+def saveEntriesCheckpoint(checkpointFile, filePath, projection, resumePoint, counts):
+    """Saves the state of getEntries: the position from which reading
+    resumes, the counters and the dictionaries extracted so far.
+    """
+    checkpoint = { "format": ENTRIES_CHECKPOINT_FORMAT, "filePath": filePath, "projection": projection,
+                   "resumePoint": resumePoint, "counts": counts,
+                   "translationKeys": translationKeys, "dictLexEntries": dictLexEntries,
+                   "dictSenses": dictSenses, "dictSynonyms": dictSynonyms,
+                   "dictParkedTrans": dictParkedTrans, "dictDefSeq": dictDefSeq,
+                   "dictWkTrans": dictWkTrans,
+                   "dictWkDef": dictWkDef, "dictWkSynm": dictWkSynm }
+    gen_utils.dumpCheckpoint(checkpoint, checkpointFile)
+    logger.info("Checkpoint saved at line %d", resumePoint.lineNum)
+
+
+def loadEntriesCheckpoint(checkpointFile, filePath, projection):
+    """Restores the dictionaries of the last checkpoint of getEntries
+    on the same input file and projection. Returns the checkpoint, or
+    None if there is none to resume from.
+    """
+    global translationKeys, dictLexEntries, dictSenses, dictSynonyms
+    global dictParkedTrans, dictDefSeq
+    global dictWkTrans, dictWkDef, dictWkSynm
+
+    checkpoint = gen_utils.loadCheckpoint(checkpointFile)
+    if checkpoint is None:
+        logger.warning("No checkpoint found in %s; starting from the beginning", checkpointFile)
+        return None
+    if checkpoint.get("format") != ENTRIES_CHECKPOINT_FORMAT:
+        logger.warning("Checkpoint %s is from an older version; starting from the beginning", checkpointFile)
+        return None
+    if checkpoint["filePath"] != filePath or checkpoint["projection"] != projection:
+        logger.warning("Checkpoint %s is for another run; starting from the beginning", checkpointFile)
+        return None
+    translationKeys = checkpoint["translationKeys"]
+    dictLexEntries = checkpoint["dictLexEntries"]
+    dictSenses = checkpoint["dictSenses"]
+    dictSynonyms = checkpoint["dictSynonyms"]
+    dictParkedTrans = checkpoint["dictParkedTrans"]
+    dictDefSeq = checkpoint["dictDefSeq"]
+    dictWkTrans = checkpoint["dictWkTrans"]
+    dictWkDef = checkpoint["dictWkDef"]
+    dictWkSynm = checkpoint["dictWkSynm"]
+    logger.info("Resuming from the checkpoint at line %d", checkpoint["resumePoint"].lineNum)
+    return checkpoint
+
+
+def getEntries(filePath, testNumLines=math.inf, numWorkers=1, projection=FULL_PROJECTION,
+               checkpointFile="", resume=False):
     """Extracts the translations, lexical entries, lexical senses
-    from the main input file
+    from the main input file. With numWorkers > 1, the bz2 blocks
+    of the input file are decompressed in parallel. Only the record
+    types and properties of the projection are extracted; the other
+    records, and the <http: records, are counted without being read.
+    With a checkpointFile, the state of the extraction is saved every
+    CHECKPOINT_INTERVAL_SECS, and with resume, the extraction resumes
+    from the last saved state. The translations are added to the
+    dictionaries for alignment as they are extracted, and
+    makeDByDictionaries completes these once getEntries returns.
+    The errors of the extraction are logged and raised, so that a
+    partial extraction is never returned.
     """
 
-    global dictTranslations
+    global translationKeys
     global dictLexEntries
     global dictSenses
+    global dictSynonyms
 
     global dbTransCount
     global lemonLexEntryCount
@@ -628,63 +890,84 @@ def getEntries(filePath, testNumLines=math.inf):
     global synonymRelationsCount
 
     global srcLangCode3ch
-
+    global defKeyMemo
+
+    numRec = 0; engCount = 0;  httpCount = 0; skippedCount = 0
+    dbTransCount = 0;  lemonLexEntryCount = 0; lemonLexSenseCount = 0
+    senseWithSynCount=0; lexEntryWithSynCount=0
+    synonymRelationsCount=0
+    setProjection(projection)
+    reader = dby_reader.DByRecordReader((srcLangCode3ch, '<http:'), skipPrefixes=('<http:',),
+                                        recordTypes=projection.keys())
+    resumePoint = None
+    if checkpointFile and resume:
+        checkpoint = loadEntriesCheckpoint(checkpointFile, filePath, projection)
+        if checkpoint is not None:
+            resumePoint = checkpoint["resumePoint"]
+            counts = checkpoint["counts"]
+            numRec = counts["numRec"]; engCount = counts["engCount"]
+            httpCount = counts["httpCount"]; skippedCount = counts["skippedCount"]
+            dbTransCount = counts["dbTransCount"]; lemonLexEntryCount = counts["lemonLexEntryCount"]
+            lemonLexSenseCount = counts["lemonLexSenseCount"]
+            senseWithSynCount = counts["senseWithSynCount"]; lexEntryWithSynCount = counts["lexEntryWithSynCount"]
+            synonymRelationsCount = counts["synonymRelationsCount"]
+    lastCheckpointTime = time.monotonic()
+    prevResumePoint = None   # position following the previous record, if reading can resume there
     try:
-        inputFile = bz2.open(filePath, 'rt', encoding='utf-8')
-        lineNum = 1
         #testLim = testNumLines #28000000 #200 #28000000 #200  #28000000
-
-        line = inputFile.readline()
-        numRec = 0; engCount = 0;  httpCount = 0
-        dbTransCount = 0;  lemonLexEntryCount = 0; lemonLexSenseCount = 0
-        senseWithSynCount=0; lexEntryWithSynCount=0
-        synonymRelationsCount=0
-        readLineCount = 1
-        while line:
-            if line.startswith(srcLangCode3ch) or line.startswith('<http:') :
-               #read next lines until a blank line is encountered
-               if line.startswith(srcLangCode3ch):
-                   engRec = True
-                   engCount +=1
-               else:
-                   engRec = False
-                   httpCount +=1
-               buf = []
-               while line.strip() :
-                   buf.append(line.strip())
-                   line = inputFile.readline()
-                   readLineCount += 1
-                   lineNum += 1
-               if engRec :
-                   reBuf = reOrgBuf2(buf, lineNum-len(buf)+1)
-                   extractTranslation(reBuf, (lineNum-len(buf)+1))
-                   extractLexicalEntry(reBuf,(lineNum-len(buf)+1))
-                   extractLexicalSense(reBuf, (lineNum-len(buf)+1))
-                   extractSynonymRelation(reBuf, (lineNum-len(buf)+1))
-               numRec += 1
+        for rec in reader.iterFile(filePath, numWorkers=numWorkers, resumePoint=resumePoint):
+            # the state saved is that after the previous record
+            if checkpointFile and prevResumePoint is not None and \
+               time.monotonic() - lastCheckpointTime >= CHECKPOINT_INTERVAL_SECS:
+                saveEntriesCheckpoint(checkpointFile, filePath, projection, prevResumePoint,
+                                      dict(numRec=numRec, engCount=engCount, httpCount=httpCount,
+                                           skippedCount=skippedCount, dbTransCount=dbTransCount,
+                                           lemonLexEntryCount=lemonLexEntryCount,
+                                           lemonLexSenseCount=lemonLexSenseCount,
+                                           senseWithSynCount=senseWithSynCount,
+                                           lexEntryWithSynCount=lexEntryWithSynCount,
+                                           synonymRelationsCount=synonymRelationsCount))
+                lastCheckpointTime = time.monotonic()
+            prevResumePoint = reader.resumePoint
+            if rec.firstLineNum > testNumLines:
+                break
+            if rec.prefix == srcLangCode3ch:
+                engCount += 1
+                numRec += 1
+                if not rec.lines:
+                    skippedCount += 1   # record type not in the projection
+                    continue
+                # the line number saved with the extracted records has
+                # always been the one following the record's first line
+                firstLineNum = rec.firstLineNum + 1
+                reBuf = reOrgBuf2(rec.lines, firstLineNum)
+                if len(reBuf) <= 1:
+                    continue
+                # the record type is given by the header line "a <type> ;"
+                for recType, extractRecord in recordExtractors:
+                    if recType in reBuf[1]:
+                        extractRecord(reBuf, firstLineNum)
+            elif rec.prefix:
+                httpCount += 1
+                numRec += 1
             else:
-                if line.rstrip():
-                    logger.info("Line %d not processed as record: %s", lineNum, line)
-                line=inputFile.readline()
-                readLineCount+=1
-                lineNum += 1
-
-            if lineNum > testNumLines:
-               break
+                logger.info("Line %d not processed as record: %s", rec.firstLineNum, rec.lines[0])
+        if checkpointFile and os.path.exists(checkpointFile):
+            os.remove(checkpointFile)   # the extraction is complete
 
     except IOError as e:
-        errno, strerror = e.args
-        logger.exception("Exception: I/O error({0}): {1}".format(errno, strerror))
+        logger.exception("Exception: I/O error({0}): {1}".format(e.errno, e.strerror))
+        raise
     except ValueError:
         logger.exception("Exception: ValueError: Could not convert data to an integer.")
+        raise
     except Exception as ex:
         template = "An exception of type {0} occured. Arguments:\n{1!r}"
         message = template.format(type(ex).__name__, ex.args)
         logger.exception("Unexpected error: %s", sys.exc_info()[0])
         logger.exception(message)
-    finally:
-        if inputFile:
-            inputFile.close()
+        raise
+    readLineCount = reader.lineCount
 
     logger.info("Number of lines read from inputFile: %d", readLineCount)
     logger.info("Number of records processed: %d", numRec)
@@ -692,6 +975,7 @@ def getEntries(filePath, testNumLines=math.inf):
     logger.info("Number of xxx_records headed by 3-char lang code: %d", engCount)
     logger.info("Number of http_records: %d", httpCount)
     logger.info("Total number of records encountered: %d", (httpCount+engCount))
+    logger.info("Number of xxx_records not in the projection: %d", skippedCount)
 
     logger.info("Number of dbnary:Translation processed: %d", dbTransCount)
     logger.info("Number of LexicalEntries processed: %d", lemonLexEntryCount)
@@ -702,11 +986,18 @@ def getEntries(filePath, testNumLines=math.inf):
     logger.info("Number of LexicalSense records with synonyms: %d", senseWithSynCount)
     logger.info("Total number of records with synonyms: %d", (lexEntryWithSynCount+senseWithSynCount))
 
-    logger.info("Number of translations saved: %d", len(dictTranslations))
+    logger.info("Number of translations saved: %d", len(translationKeys))
+    logger.info("Number of translations waiting for their lexical entry: %d",
+                sum( len(x) for x in dictParkedTrans.values() ))
     logger.info("Number of lexical entries saved: %d", len(dictLexEntries))
     logger.info("Number of lexical senses saved: %d", len(dictSenses))
     logger.info("Number of synonym-relations saved: %d", len(dictSynonyms))
 
+    # the memo is released once the extraction is done; the defkeys
+    # computed by makeDByDictionaries are memoized again
+    logger.info("Number of distinct defkey inputs: %d", len(defKeyMemo))
+    defKeyMemo = def_keys.DefKeyMemo()
+
 
 def reOrgBuf2(buf, firstLineNum):
     """Re-organises the record such that the first line has only the record
@@ -714,14 +1005,12 @@ def reOrgBuf2(buf, firstLineNum):
     pairs; for consistency in the extraction process.
     """
     if buf :
-        firstLineSplit = re.split("\s+", buf[0].strip())
+        firstLineSplit = buf[0].split()
         # Check whether first line has more than 1 non-space substring
         if len(firstLineSplit) > 1:
             line0 = firstLineSplit[0]
             line1 = " ".join(firstLineSplit[1:])
-            newBuf = [line0, line1]
-            newBuf.extend(buf[1:])
-            return newBuf
+            return [line0, line1] + buf[1:]
         return buf   # Buffer does not need to be re-organised
     # print("Error in reOrgBuf2: Line "+str(firstLineNum)+"+: Buffer is empty")
     logger.debug("Record buffer is empty: line %d+", firstLineNum)
@@ -788,16 +1077,16 @@ def testPrint(dictToPrint, numRecToPrint, title):
 
 
 def printTransNonTgtLang():
-    """ Prints out the translation records that do not have
-        target language codes.
+    """ Prints out the defkeys of the translation records that do not
+        have target language codes.
     """
     print("Translations without Target Language Code")
-    nonTgts = [ x for x in dictTranslations.keys() if (not dictTranslations[x].tgtLangCode)]
+    nonTgts = [ x for x in dictWkTrans.keys() if any( not rec.lang for rec in dictWkTrans[x] ) ]
     print("Total records: "+str(len(nonTgts)))
     for key in sorted(nonTgts):
         print("Key: ", end="")
-        gen_utils.uprint(key)
-        gen_utils.uprint(dictTranslations[key])
+        gen_utils.uprint(def_keys.hexKey(key))
+        gen_utils.uprint([ rec for rec in dictWkTrans[key] if not rec.lang ])
 
 def testPrintWkDict(numRecToPrint, title):
     """Prints out the reorganized translation/synonym dictionaries
@@ -809,7 +1098,7 @@ def testPrintWkDict(numRecToPrint, title):
     for key in dictWkDef:
         printRecCount += 1
         print("Record "+str(printRecCount))
-        print("Key: ", end=""); gen_utils.uprint(key)
+        print("Key: ", end=""); gen_utils.uprint(def_keys.hexKey(key))
         print("++Synonym translations++")
         if key in dictWkSynm:
             gen_utils.uprint(dictWkSynm[key])
@@ -829,100 +1118,315 @@ def testPrintWkDict(numRecToPrint, title):
 
 
 
-def computeAlignmentStats(wnKeys, defKeys, dictAlignments):
+def buildPostingsIndex(defKeys, dictToIndex):
     """
-    Computes the statistics for the lemma/translation-count
-    similarity matching. Assumes data are already matched
-    in POS.
+    Builds the inverted index from each lemma record (lemma, lang, pos)
+    to the positions in defKeys of the defkeys whose list in
+    dictToIndex holds that record. The lists hold distinct records,
+    so each position appears at most once in a postings list.
     """
-    #global dictAlignments
-    global dictWkSynm, dictWkTrans, dictWkDef
-    global dictWnTrans
+    postings = {}
+    for defPos, defkey in enumerate(defKeys):
+        for rec in dictToIndex.get(defkey, ()):
+            if rec in postings:
+                postings[rec].append(defPos)
+            else:
+                postings[rec] = [defPos]
+    return postings
+
+
+def countPostingsMatches(lemmaRecs, postings):
+    """
+    Counts, for every defkey position in the postings of the given
+    lemma records, the number of distinct records it shares with them.
+    """
+    dictMatches = {}
+    for rec in set(lemmaRecs):
+        for defPos in postings.get(rec, ()):
+            dictMatches[defPos] = dictMatches.get(defPos, 0) + 1
+    return dictMatches
+
+
+def internLemmaDictionaries():
+    """
+    Interns the lemma records of dictWnTrans, dictWkSynm and dictWkTrans
+    into integer ids, and stores each synset and defkey as sorted id
+    arrays for the "interned" alignment engine.
+    """
+    global lemmaVocab, wnLemmaTable, wkLemmaTable
+
+    lemmaVocab = lemma_vocab.LemmaVocab()
+    wkLemmaTable = lemma_vocab.internWkTrans(list(dictWkDef.keys()), dictWkSynm, dictWkTrans, lemmaVocab)
+    wnLemmaTable = lemma_vocab.internWnTrans(dictWnTrans, srcLangCode3ch, lemmaVocab)
+    logger.info("Number of interned lemma records: %d", len(lemmaVocab))
+
+
+def prepareAlignment(defKeys, engine):
+    """
+    Builds the index of the given alignment engine over the defkeys
+    in defKeys. The "postings" engine indexes the lemma records; the
+    "interned" engine indexes the interned lemma ids, and computes
+    the overlaps by sorted id array intersection.
+    """
+    if engine == "postings":
+        return {"engine": engine, "defKeys": defKeys,
+                "synmPostings": buildPostingsIndex(defKeys, dictWkSynm),
+                "transPostings": buildPostingsIndex(defKeys, dictWkTrans)}
+    if engine == "interned":
+        if wkLemmaTable is None or wnLemmaTable is None:
+            internLemmaDictionaries()
+        wkTable = lemma_vocab.subTable(wkLemmaTable, defKeys)
+        numIds = len(lemmaVocab)
+        return {"engine": engine, "defKeys": defKeys, "wkTable": wkTable,
+                "synmPostings": lemma_vocab.buildIdPostings(wkTable.srcIds, wkTable.srcOffsets, numIds),
+                "transPostings": lemma_vocab.buildIdPostings(wkTable.langIds, wkTable.langOffsets, numIds)}
+    raise ValueError("Unknown alignment engine: "+str(engine))
+
+
+def getPostingsCandidates(wncode, alignState):
+    """
+    Returns the match counts (defkey, srcMatch, langMatch, srcMax, langMax)
+    of the defkeys sharing at least one lemma record with the synset,
+    in defKeys order.
+    """
+    defKeys = alignState["defKeys"]
+
+    wnLemmas = dictWnTrans[wncode]
+    srcWnLemmas = [ rec for rec in wnLemmas if rec.lang==srcLangCode3ch ]
+    langWnLemmas = [ rec for rec in wnLemmas if rec.lang!=srcLangCode3ch ]
 
-    countRec = 0; testLimit=10
+    srcMatches = countPostingsMatches(srcWnLemmas, alignState["synmPostings"])
+    langMatches = countPostingsMatches(langWnLemmas, alignState["transPostings"])
 
+    candidates = []
+    for defPos in sorted(set(srcMatches).union(langMatches)):
+        defkey = defKeys[defPos]
+        srcMax = min( len(srcWnLemmas), len(dictWkSynm.get(defkey, [])) )
+        langMax = min( len(langWnLemmas), len(dictWkTrans.get(defkey, [])) )
+        candidates.append((defkey, srcMatches.get(defPos, 0), langMatches.get(defPos, 0), srcMax, langMax))
+    return candidates
+
+
+def getInternedCandidates(wncode, alignState):
+    """
+    Returns the match counts (defkey, srcMatch, langMatch, srcMax, langMax)
+    of the defkeys sharing at least one lemma id with the synset, in
+    defKeys order. The counts are computed over all the candidates
+    at once by sorted id array intersection.
+    """
+    defKeys = alignState["defKeys"]
+    wkTable = alignState["wkTable"]
+
+    wnRow = wnLemmaTable.rowOf(wncode)
+    srcWnIds = wnLemmaTable.srcRow(wnRow)
+    langWnIds = wnLemmaTable.langRow(wnRow)
+
+    candRows = np.union1d(lemma_vocab.candidateRows(srcWnIds, *alignState["synmPostings"]),
+                                      lemma_vocab.candidateRows(langWnIds, *alignState["transPostings"]))
+    numCands = len(candRows)
+
+    srcWkIds, srcSegIndex = lemma_vocab.gatherRows(wkTable.srcIds, wkTable.srcOffsets, candRows)
+    langWkIds, langSegIndex = lemma_vocab.gatherRows(wkTable.langIds, wkTable.langOffsets, candRows)
+    srcMatches = lemma_vocab.sortedOverlapCounts(srcWnIds, srcWkIds, srcSegIndex, numCands)
+    langMatches = lemma_vocab.sortedOverlapCounts(langWnIds, langWkIds, langSegIndex, numCands)
+    srcMaxes = np.minimum(wkTable.srcCounts[candRows], wnLemmaTable.srcCounts[wnRow])
+    langMaxes = np.minimum(wkTable.langCounts[candRows], wnLemmaTable.langCounts[wnRow])
+
+    return [ (defKeys[defPos], srcMatch, langMatch, srcMax, langMax)
+             for defPos, srcMatch, langMatch, srcMax, langMax
+             in zip(candRows.tolist(), srcMatches.tolist(), langMatches.tolist(),
+                    srcMaxes.tolist(), langMaxes.tolist()) ]
+
+
+def alignSynset(wncode, alignState):
+    """
+    Computes the sorted list of candidate alignment stats of one
+    wordnet synset against the defkeys indexed in alignState. Only
+    the defkeys sharing at least one lemma with the synset are visited.
+    """
     # get the fieldname index for sorting alignment stats
     isCandIndx = AlignStatsRecord._fields.index("isCand")
     scoreIndx = AlignStatsRecord._fields.index("score")
     srcMatchIndx = AlignStatsRecord._fields.index("srcMatch")
 
-    for wncode in wnKeys:  #dictWnTrans:
+    if alignState["engine"] == "interned":
+        candidates = getInternedCandidates(wncode, alignState)
+    else:
+        candidates = getPostingsCandidates(wncode, alignState)
+
+    tempStatsList = []
+
+    # the candidates come in defKeys order, so that ties in the
+    # sorting below keep the same order as a full scan of defKeys
+    for defkey, srcMatch, langMatch, srcMax, langMax in candidates:
+
+        srcPc = 0; langPc = 0
+
+        if srcMax > 0:
+            srcPc = srcMatch/srcMax
+        if langMax > 0:
+            langPc = langMatch/langMax
+
+        if (srcMatch > 0) or (langMatch > 0):
+            statsRec = AlignStatsRecord(defkey, srcMatch, langMatch, srcMax, langMax, srcPc, langPc, score=0, isCand=0)
+            isCand, score = idScoreAlignment(wncode, statsRec)
+            if isCand > 0:
+                statsRec = statsRec._replace(score=score, isCand=isCand)
+                tempStatsList.append(statsRec)
+
+    # sort list by descending isCand, descending score, and descending srcMatch
+    return sorted(tempStatsList, key=lambda x: (-x[isCandIndx], -x[scoreIndx], -x[srcMatchIndx]))
+
+
+def estimateAlignCost(wncode, alignState):
+    """
+    Estimates the work of aligning a synset as the total length
+    of the postings lists visited for its lemmas.
+    """
+    if alignState["engine"] == "interned":
+        wnRow = wnLemmaTable.rowOf(wncode)
+        return 1 + lemma_vocab.postingsLength(wnLemmaTable.srcRow(wnRow), alignState["synmPostings"][1]) + \
+                   lemma_vocab.postingsLength(wnLemmaTable.langRow(wnRow), alignState["transPostings"][1])
+    cost = 1
+    for rec in set(dictWnTrans[wncode]):
+        if rec.lang == srcLangCode3ch:
+            cost += len(alignState["synmPostings"].get(rec, ()))
+        else:
+            cost += len(alignState["transPostings"].get(rec, ()))
+    return cost
+
 
-        wnPos = dictWnTrans[wncode][0].pos
+def makeAlignShards(wnKeys, numShards, alignState):
+    """
+    Splits wnKeys into numShards shards of about equal estimated
+    work, assigning the costliest synsets first to the least loaded
+    shard. Each shard keeps the wnKeys order of its synsets.
+    """
+    costs = [ (estimateAlignCost(wncode, alignState), keyPos)
+              for keyPos, wncode in enumerate(wnKeys) ]
+    shardLoads = [ (0, shardIndx) for shardIndx in range(numShards) ]
+    shardPositions = [ [] for _ in range(numShards) ]
+    for cost, keyPos in sorted(costs, key=lambda x: (-x[0], x[1])):
+        load, shardIndx = heapq.heappop(shardLoads)
+        shardPositions[shardIndx].append(keyPos)
+        heapq.heappush(shardLoads, (load+cost, shardIndx))
+    return [ [ wnKeys[keyPos] for keyPos in sorted(positions) ]
+             for positions in shardPositions if positions ]
+
+
+def initAlignWorker(wkSynm, wkTrans, wkDef, wnTrans, wnTable, langCode3ch, thresholds, alignState):
+    """
+    Sets up the module globals of an alignment worker process.
+    """
+    global dictWkSynm, dictWkTrans, dictWkDef, dictWnTrans
+    global wnLemmaTable
+    global srcLangCode3ch, candThresholds
+    global workerAlignState
 
-        wnLemmas = dictWnTrans[wncode]
-        srcWnLemmas = [ rec for rec in wnLemmas if rec.lang==srcLangCode3ch ]
-        langWnLemmas = [ rec for rec in wnLemmas if rec not in srcWnLemmas ]
+    dictWkSynm, dictWkTrans, dictWkDef, dictWnTrans = wkSynm, wkTrans, wkDef, wnTrans
+    wnLemmaTable = wnTable
+    srcLangCode3ch = langCode3ch
+    candThresholds = thresholds
+    workerAlignState = alignState
 
-        tempStatsList = []
 
-        for defkey in defKeys:  #dictWkDef:
+def alignShard(wnShard):
+    """
+    Computes the alignments of one shard of wncodes in a worker process.
+    """
+    dictShardAlign = {}
+    for wncode in wnShard:
+        statsList = alignSynset(wncode, workerAlignState)
+        if statsList:
+            dictShardAlign[wncode] = statsList
+    return dictShardAlign
 
-            countRec += 1
 
-            srcMax = 0; langMax=0
-            srcPc = 0; langPc = 0
+def computeSparseAlignmentStats(wnKeys, defKeys, dictAlignments):
+    """
+    Computes the alignments of all the synsets in wnKeys at once
+    with the sparse matrix engine, over the interned lemma ids.
+    """
+    if wkLemmaTable is None or wnLemmaTable is None:
+        internLemmaDictionaries()
+    wnTable = lemma_vocab.subTable(wnLemmaTable, wnKeys)
+    wkTable = lemma_vocab.subTable(wkLemmaTable, defKeys)
 
-            wkPos = dictWkDef[defkey].pos
+    # id of the source language headword record of each defkey
+    headIds = np.array([ lemmaVocab.dictIds.get(WnDByTransRecord(ignore=0, lemma=dictWkDef[defkey].word,
+                                                                 pos=dictWkDef[defkey].pos, lang=srcLangCode3ch), -1)
+                         for defkey in defKeys ], dtype=np.int64)
 
-            srcWkLemmas = dictWkSynm.get(defkey, [])
-            langWkLemmas = dictWkTrans.get(defkey, [])
+    for wncode, statsList in sparse_align.computeSparseAlignment(wnTable, wkTable, len(lemmaVocab), headIds,
+                                                                 candThresholds):
+        dictAlignments[wncode] = statsList
 
-            srcMatch = len( set(srcWkLemmas).intersection(srcWnLemmas) )
-            langMatch = len( set(langWkLemmas).intersection(langWnLemmas) )
-            #langMatch = len( set(langWkLemmas).intersection(langWnLemmas) ) + srcMatch
 
-            srcMax = min( len(srcWnLemmas), len(srcWkLemmas) )
-            langMax = min( len(langWnLemmas), len(langWkLemmas))
-            #langMax = min( len(langWnLemmas)+len(srcWnLemmas), len(langWkLemmas)+len(srcWkLemmas))
+def computeAlignmentStats(wnKeys, defKeys, dictAlignments, numWorkers=1, engine="postings"):
+    """
+    Computes the statistics for the lemma/translation-count
+    similarity matching. Assumes data are already matched
+    in POS. With numWorkers > 1, the wncodes are split into
+    work-balanced shards aligned in a process pool, and the
+    shard results are merged back in wnKeys order. The "sparse"
+    engine computes all the overlaps of the POS with sparse
+    matrix products instead, in the calling process.
+    """
+    #global dictAlignments
+    global dictWkSynm, dictWkTrans, dictWkDef
+    global dictWnTrans
 
-            if srcMax > 0:
-                srcPc = srcMatch/srcMax
-            if langMax > 0:
-                langPc = langMatch/langMax
+    if engine == "sparse":
+        computeSparseAlignmentStats(wnKeys, defKeys, dictAlignments)
+        return
 
+    alignState = prepareAlignment(defKeys, engine)
 
-            if (srcMatch > 0) or (langMatch > 0):
-                statsRec = AlignStatsRecord(defkey, srcMatch, langMatch, srcMax, langMax, srcPc, langPc, score=0, isCand=0)
-                isCand, score = idScoreAlignment(wncode, statsRec)
-                if isCand > 0:
-                    statsRec = statsRec._replace(score=score, isCand=isCand)
-                    tempStatsList.append(statsRec)
+    if numWorkers <= 1 or len(wnKeys) <= 1:
+        for wncode in wnKeys:  #dictWnTrans:
+            statsList = alignSynset(wncode, alignState)
+            if statsList:
+                dictAlignments[wncode] = statsList
+        return
 
-            if countRec >= testLimit:
-                pass #break
+    shards = makeAlignShards(wnKeys, numWorkers*ALIGN_SHARDS_PER_WORKER, alignState)
+    logger.info("Aligning %d synsets in %d shards with %d workers", len(wnKeys), len(shards), numWorkers)
 
-        if tempStatsList:
-            # sort list by descending isCand, descending score, and descending srcMatch
-            dictAlignments[wncode] = sorted(tempStatsList,
-                                             key=lambda x: (-x[isCandIndx], -x[scoreIndx], -x[srcMatchIndx]))
+    # forked workers share the dictionaries with the parent instead
+    # of receiving a pickled copy of them
+    if "fork" in multiprocessing.get_all_start_methods():
+        mpContext = multiprocessing.get_context("fork")
+    else:
+        mpContext = None
+    initArgs = (dictWkSynm, dictWkTrans, dictWkDef, dictWnTrans, wnLemmaTable, srcLangCode3ch, candThresholds, alignState)
+    dictMerged = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers, mp_context=mpContext,
+                                                initializer=initAlignWorker, initargs=initArgs) as executor:
+        for dictShardAlign in executor.map(alignShard, shards):
+            dictMerged.update(dictShardAlign)
 
-        if countRec >= testLimit:
-            pass #break
+    # merge in wnKeys order, for the same result as the serial run
+    for wncode in wnKeys:
+        if wncode in dictMerged:
+            dictAlignments[wncode] = dictMerged[wncode]
 
 
 
 
 def pickleDump():
     """
-    Pickles the data structures for computing the overlap translation
-    statistics.
+    Dumps the data structures for computing the overlap translation
+    statistics, as memory-mapped columnar stores, and the
+    wordnet statistics in the dictWnStats.json sidecar.
     """
 
     global dictWkTrans, dictWkSynm, dictWnTrans, dictWkDef
 
-    with open( "dictWkTrans.p", "wb" ) as f:
-        pickle.dump( dictWkTrans, f  )
-        f.close()
-    with open( "dictWkSynm.p", "wb" ) as f:
-        pickle.dump( dictWkSynm, f )
-        f.close()
-    with open( "dictWnTrans.p", "wb" ) as f:
-        pickle.dump( dictWnTrans, f )
-        f.close()
-    with open( "dictWkDef.p", "wb" ) as f:
-        pickle.dump( dictWkDef, f )
-        f.close()
+    gen_utils.dumpWiktTranslations(dictWkTrans)
+    gen_utils.dumpWiktSynonyms(dictWkSynm)
+    gen_utils.dumpWnTranslations(dictWnTrans)
+    gen_utils.dumpWnStats(dictWnStats)
+    gen_utils.dumpWiktDefinitions(dictWkDef)
 
     print("Dumps are complete.")
 
@@ -937,6 +1441,7 @@ def testAlignStatsByPos(givenPos, dbyFilePath):
     """
     global dictWkTrans, dictWkSynm, dictWnTrans, dictWkDef
     global srcLangCode2ch, srcLangCode3ch
+    global wnLemmaTable, wkLemmaTable
 
     dictAlign = {}
     # path to main input file
@@ -947,18 +1452,12 @@ def testAlignStatsByPos(givenPos, dbyFilePath):
     srcLangCode2ch, srcLangCode3ch = getSrcLangCodes(dbyFilePath, DBY_LANG_CODES_FILENAME)
     print("Source language codes: "+srcLangCode2ch+" "+srcLangCode3ch)
 
-    with open( "dictWkTrans.p", "rb" ) as f:   # load the dbnary translations
-        dictWkTrans = pickle.load( f )
-        f.close()
-    with open( "dictWkSynm.p", "rb" ) as f:    # load the dbnary synonyms
-        dictWkSynm = pickle.load( f )
-        f.close()
-    with open( "dictWnTrans.p", "rb" ) as f:    # load the wordnet lemmas
-        dictWnTrans = pickle.load( f )
-        f.close()
-    with open( "dictWkDef.p", "rb" ) as f:      # load the dbnary defintions
-        dictWkDef = pickle.load( f )
-        f.close()
+    dictWkTrans = gen_utils.loadWiktTranslations()   # load the dbnary translations
+    dictWkSynm = gen_utils.loadWiktSynonyms()       # load the dbnary synonyms
+    dictWnTrans = gen_utils.loadWnTranslations()    # load the wordnet lemmas
+    dictWkDef = gen_utils.loadWiktDefinitions()     # load the dbnary defintions
+    # the interned lemma ids are rebuilt from the loaded dictionaries
+    wnLemmaTable = None; wkLemmaTable = None
 
     # select the keys for the given POS
     defKeys = [ k for k, v in dictWkDef.items() if v.pos==givenPos ]
@@ -983,12 +1482,13 @@ def testAlignStatsByPos(givenPos, dbyFilePath):
     return dictAlign
 
 
-def getAlignStatsByPos(givenPos, dbyFilePath):
+def getAlignStatsByPos(givenPos, dbyFilePath, numWorkers=1, engine="postings"):
     """
     Tests the computation of the alignment stats, loading
     in the pickled data structures to save on computation
     time. Parameters are testPos ("a", "r", "n", "v"),
-    and DBnary filepath.
+    DBnary filepath, the number of alignment worker processes,
+    and the alignment engine ("postings", "interned" or "sparse").
     """
     global dictWkTrans, dictWkSynm, dictWnTrans, dictWkDef
     global srcLangCode2ch, srcLangCode3ch
@@ -1022,7 +1522,7 @@ def getAlignStatsByPos(givenPos, dbyFilePath):
     print("Size of", givenPos, "wkDefs:", len(defKeys))
     print("Size of", givenPos, "wnTrans:", len(wnKeys))
 
-    computeAlignmentStats(wnKeys, defKeys, dictAlign)
+    computeAlignmentStats(wnKeys, defKeys, dictAlign, numWorkers, engine)
 
     print("Size of alignment dictionary:", len(dictAlign))
 
@@ -1044,20 +1544,21 @@ def identifyCandAlignments():
     global dictAlignments
     global dictWnTrans, dictWkDef
 
+    t = candThresholds
     isCand = 0
     for k, s in dictAlignments.items():
         # choose candidate based on match stats
-        if s.langPc >= 0.7:
+        if s.langPc >= t.langPc:
             isCand = 1
-        if s.srcPc >= 0.5:
-            if s.langPc >= 0.5:
+        if s.srcPc >= t.srcPc:
+            if s.langPc >= t.srcLangPc:
                 isCand = 1
-            if s.langPc >= 0.45 and s.langMatch > 5:
+            if s.langPc >= t.minLangPc and s.langMatch > t.minLangMatch:
                 isCand = 1
         # require that the Wikt source language headword is in the wordnet sense
         if isCand == 1:
             defkey = k[1]; wncode = k[0]
-            srcWkHeadword = normLemma(dictWkDef[ defkey ].word)
+            srcWkHeadword = dictWkDef[ defkey ].word   # normalized when saved
             srcLang = srcLangCode3ch
             wkPos = posMap.get(dictWkDef[ defkey ].pos, "")
             wkRec = WnDByTransRecord(ignore=0, lemma=srcWkHeadword, pos=wkPos, lang=srcLang)
@@ -1092,18 +1593,19 @@ def idScoreAlignment(wncode, wktuple):
     global srcLangCode3ch
     global posMap
 
+    t = candThresholds
     isCand = 0
-    if wktuple.langPc >= 0.7:
+    if wktuple.langPc >= t.langPc:
         isCand = 1
-    if wktuple.srcPc >= 0.5:
-        if wktuple.langPc >= 0.5:
+    if wktuple.srcPc >= t.srcPc:
+        if wktuple.langPc >= t.srcLangPc:
             isCand = 1
-        if wktuple.langPc >= 0.45 and wktuple.langMatch > 5:
+        if wktuple.langPc >= t.minLangPc and wktuple.langMatch > t.minLangMatch:
             isCand = 1
     # require that the Wikt source language headword is in the wordnet sense
     if isCand == 1:
         defkey = wktuple.defkey
-        srcWkHeadword = normLemma(dictWkDef[ defkey ].word)
+        srcWkHeadword = dictWkDef[ defkey ].word   # normalized when saved
         srcLang = srcLangCode3ch
         wkPos = dictWkDef[ defkey ].pos #wkPos = posMap.get(dictWkDef[ defkey ].pos, "")
         wkRec = WnDByTransRecord(ignore=0, lemma=srcWkHeadword, pos=wkPos, lang=srcLang)
@@ -1135,13 +1637,42 @@ def selectAlignments():
 
 
 
-def extractData(dbyFilePath, wndbFilePath, logLevel="warning", logFileName=""):
+def startWnTransLoad(wndbFilePath):
+    """
+    Starts reading the wordnet translations in a worker process,
+    which also counts them. Returns the executor and the future of
+    the (dictWnTrans, dictWnStats) result.
+    """
+    # forked, so that the worker does not import this module again
+    if "fork" in multiprocessing.get_all_start_methods():
+        mpContext = multiprocessing.get_context("fork")
+    else:
+        mpContext = None
+    wnExecutor = concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=mpContext)
+    startTime = time.time()
+    wnFuture = wnExecutor.submit(wnparse.getWnTransWithStats, wndbFilePath)
+    wnFuture.add_done_callback(lambda future: logger.info("WordNet load finished after %.1f secs",
+                                                          time.time()-startTime))
+    logger.info("WordNet load started from %s", wndbFilePath)
+    return wnExecutor, wnFuture
+
+
+def joinWnTransLoad(wnExecutor, wnFuture):
+    """Waits for the WordNet load started by startWnTransLoad, and returns
+    dictWnTrans and dictWnStats."""
+    if not wnFuture.done():
+        logger.info("DBnary parse finished; waiting for the WordNet load")
+    try:
+        return wnFuture.result()
+    except Exception:
+        logger.exception("WordNet load failed")
+        raise
+    finally:
+        wnExecutor.shutdown(wait=True)
+
 
-    global srcLangCode2ch, srcLangCode3ch
+def configureLogging(logLevel="warning", logFileName=""):
     global logger
-    global dictWnTrans
-    #global dictWkTranslations
-    global DBY_LANG_CODES_FILENAME
 
     logger = logging.getLogger(__name__)
     # Configure and initialize the logging; default level is set to "warning"
@@ -1151,22 +1682,54 @@ def extractData(dbyFilePath, wndbFilePath, logLevel="warning", logFileName=""):
 
     logger.debug("Start Logging!")
 
+
+def extractData(dbyFilePath, wndbFilePath, logLevel="warning", logFileName="", numWorkers=1,
+                projection=FULL_PROJECTION, resume=False, build=True):
+    """
+    Extracts the DBnary dump at dbyFilePath while the wordnet translations
+    are read from wndbFilePath. With build, the dictionaries for alignment
+    are then completed by buildData.
+    """
+
+    global srcLangCode2ch, srcLangCode3ch
+    global dictWnTrans, dictWnStats
+    #global dictWkTranslations
+    global DBY_LANG_CODES_FILENAME
+
+    configureLogging(logLevel, logFileName)
+
     srcLangCode2ch, srcLangCode3ch = getSrcLangCodes(dbyFilePath, DBY_LANG_CODES_FILENAME)
     print("language codes: "+srcLangCode2ch+" "+srcLangCode3ch)
-    getEntries(dbyFilePath)
+
+    # read in the wordnet data from the sql database found at wndbFilePath
+    # in a worker process, while the DBnary dump is parsed
+    wnExecutor, wnFuture = startWnTransLoad(wndbFilePath)
+    try:
+        getEntries(dbyFilePath, numWorkers=numWorkers, projection=projection,
+                   checkpointFile=DBY_CHECKPOINT_FILENAME, resume=resume)
+    except BaseException:
+        logger.error("DBnary parse failed; the WordNet load is abandoned")
+        wnExecutor.shutdown(wait=False, cancel_futures=True)
+        raise
 
     # test the DBnary extracted data
     testPrint(dictLexEntries, 10, "Testing the Lexical Entries dictionary")
     print()
     testPrint(dictSynonyms, 10, "Testing the synonyms dictionary")
-    print()
-    testPrint(dictTranslations, 10, "Testing Wk Translations Dictionary")
 
-    # read in the wordnet data from the sql database found at dbFilePath
-    dictWnTrans = wnparse.getWnTrans(wndbFilePath)
+    dictWnTrans, dictWnStats = joinWnTransLoad(wnExecutor, wnFuture)
 
     testPrint(dictWnTrans, 10, "Wordnet Translations")
 
+    if build:
+        buildData()
+
+    return None
+
+
+def buildData():
+    """Completes the dictionaries for alignment from the extracted data."""
+    numLexEntries = len(dictLexEntries)   # released by makeDByDictionaries
     makeDByDictionaries()
 
     testPrintWkDict(10, "Testing the Wk Dictionaries")
@@ -1174,62 +1737,169 @@ def extractData(dbyFilePath, wndbFilePath, logLevel="warning", logFileName=""):
     print("Size of wk Translations:"+str(len(dictWkTrans)))
     print("Size of wk synonyms:"+str(len(dictWkSynm)))
     print("Size of wn senses:"+str(len(dictWnTrans)))
-    print("Size of wk lex entries:"+str(len(dictLexEntries)))
+    print("Size of wk lex entries:"+str(numLexEntries))
+
+
+def dumpExtractedData(fileName):
+    """
+    Saves the data extracted by extractData(build=False), so that the
+    dictionaries can be built from it by another run.
+    """
+    extracted = { "format": ENTRIES_CHECKPOINT_FORMAT,
+                  "srcLangCodes": (srcLangCode2ch, srcLangCode3ch),
+                  "dictLexEntries": dictLexEntries, "dictSenses": dictSenses,
+                  "dictSynonyms": dictSynonyms, "dictParkedTrans": dictParkedTrans,
+                  "dictDefSeq": dictDefSeq, "dictWkTrans": dictWkTrans,
+                  "dictWkDef": dictWkDef, "dictWkSynm": dictWkSynm,
+                  "dictWnTrans": dictWnTrans, "dictWnStats": dictWnStats }
+    return gen_utils.dumpCheckpoint(extracted, fileName)
 
-    return None
 
-def getAlignStats(dbyFilePath, alignFilePath):
+def loadExtractedData(fileName):
+    """
+    Restores the data saved by dumpExtractedData. Returns False if there
+    is none, or if it is from an older version.
+    """
+    global srcLangCode2ch, srcLangCode3ch
+    global dictLexEntries, dictSenses, dictSynonyms, dictParkedTrans, dictDefSeq
+    global dictWkTrans, dictWkDef, dictWkSynm, dictWnTrans, dictWnStats
+
+    extracted = gen_utils.loadCheckpoint(fileName)
+    if extracted is None or extracted.get("format") != ENTRIES_CHECKPOINT_FORMAT:
+        return False
+    srcLangCode2ch, srcLangCode3ch = extracted["srcLangCodes"]
+    dictLexEntries = extracted["dictLexEntries"]
+    dictSenses = extracted["dictSenses"]
+    dictSynonyms = extracted["dictSynonyms"]
+    dictParkedTrans = extracted["dictParkedTrans"]
+    dictDefSeq = extracted["dictDefSeq"]
+    dictWkTrans = extracted["dictWkTrans"]
+    dictWkDef = extracted["dictWkDef"]
+    dictWkSynm = extracted["dictWkSynm"]
+    dictWnTrans = extracted["dictWnTrans"]
+    dictWnStats = extracted["dictWnStats"]
+    return True
+
+def getAlignStats(dbyFilePath, alignFilePath, numWorkers=1, engine="postings"):
     """
     Compute the dictionary of alignments for all POS
     """
     global dictAlignments
     dictAlignments = {}
     for pos in posMap.values():
-        dictAlignments.update(getAlignStatsByPos(pos, dbyFilePath))
+        dictAlignments.update(getAlignStatsByPos(pos, dbyFilePath, numWorkers, engine))
     gen_utils.dumpAlignments(dictAlignments, alignFilePath)
 
 
-def main(dbyFilePath, wndbFilePath, logLevel="warning", logFile="") :
-    startTime = datetime.datetime.now()
-
-
-    extractData(dbyFilePath, wndbFilePath, logLevel, logFile)  # default log to screen and level set to "warning"
-    endTime = datetime.datetime.now()
-
-    # pickle the extraction data dictionaries
-    pickleDump()
-    print("End dump time:", datetime.datetime.now())
-
-    # test the alignment selecting the POS ("a", "v", "r", "n")
-    # uses the pickled dump data dictionaries,
-    # and pickles the resulting alignment dictionary
-    testPos = "r"
-    alignDumpFileName="align-r.p"
-    dictAlignR=getAlignStatsByPos(testPos, dbyFilePath)
-
+def loadAlignmentInputs():
+    """
+    Loads the pickled alignment inputs of the previous run, as a tuple
+    (dictWkDef, dictWkSynm, dictWkTrans, dictWnTrans), with binary defkeys.
+    """
+    return (def_keys.BinaryKeyDict(gen_utils.loadWiktDefinitions()),
+            def_keys.BinaryKeyDict(gen_utils.loadWiktSynonyms()),
+            def_keys.BinaryKeyDict(gen_utils.loadWiktTranslations()),
+            gen_utils.loadWnTranslations())
 
-    # get the dictionary of all POS alignments
-    # and dumps the alignment dictionary
-    alignFileName = "align-all.p"
-    getAlignStats(dbyFilePath, alignFileName)
 
-    print("Processing Start time:", startTime)
-    print("Processing End time:", endTime)
+def loadBuiltData(dbyFilePath):
+    """
+    Loads the dictionaries for alignment saved by pickleDump, with
+    binary defkeys, and the language codes of the DBnary dump.
+    """
+    global srcLangCode2ch, srcLangCode3ch
+    global dictWkDef, dictWkSynm, dictWkTrans, dictWnTrans
 
+    srcLangCode2ch, srcLangCode3ch = getSrcLangCodes(dbyFilePath, DBY_LANG_CODES_FILENAME)
+    dictWkDef, dictWkSynm, dictWkTrans, dictWnTrans = loadAlignmentInputs()
 
-##### call main() ####
 
-dbyFilePath = "../../dbnary/downloads/en_dbnary_lemon_july.ttl.bz2"
-wndbFilePath = "../../data/sqlite_db/wn-multix.db"
-main(dbyFilePath, wndbFilePath)
+def getDefContentHash(defkey, dictDef, dictSynm, dictTrans):
+    """
+    Returns the hash of the content of a defkey used by the alignment:
+    its headword and POS, its synonyms and its translations.
+    """
+    defRec = dictDef[defkey]
+    content = (defRec.word, defRec.pos, dictSynm.get(defkey, []), dictTrans.get(defkey, []))
+    return hashlib.sha1( repr(content).encode(encoding='utf-8') ).digest()
 
 
+def getChangedDefKeys(prevInputs):
+    """
+    Returns the set of the defkeys added, removed or changed since
+    the run whose alignment inputs are prevInputs.
+    """
+    prevWkDef, prevWkSynm, prevWkTrans, _ = prevInputs
+    changed = set(dictWkDef.keys()).symmetric_difference(prevWkDef.keys())
+    for defkey in dictWkDef:
+        if defkey in prevWkDef and \
+           getDefContentHash(defkey, dictWkDef, dictWkSynm, dictWkTrans) != \
+           getDefContentHash(defkey, prevWkDef, prevWkSynm, prevWkTrans):
+            changed.add(defkey)
+    return changed
 
 
+def getAffectedWncodes(changedDefKeys, prevInputs):
+    """
+    Returns the set of the wncodes whose alignments may differ from
+    those of the previous run: the synsets sharing a lemma record with
+    the old or new content of a changed defkey, and the synsets whose
+    lemmas changed.
+    """
+    _, prevWkSynm, prevWkTrans, prevWnTrans = prevInputs
+    touchedRecs = set()
+    for defkey in changedDefKeys:
+        for dictToCheck in (dictWkSynm, dictWkTrans, prevWkSynm, prevWkTrans):
+            touchedRecs.update(dictToCheck.get(defkey, []))
+    return { wncode for wncode, recList in dictWnTrans.items()
+             if prevWnTrans.get(wncode) != recList or not touchedRecs.isdisjoint(recList) }
 
 
+def isOrderKept(defKeys, prevDefKeys):
+    """Tells whether the defkeys found in both lists are in the same order."""
+    prevIndex = { defkey: i for i, defkey in enumerate(prevDefKeys) }
+    prevPositions = [ prevIndex[defkey] for defkey in defKeys if defkey in prevIndex ]
+    return all( a < b for a, b in zip(prevPositions, prevPositions[1:]) )
 
 
+def updateAlignStats(alignFilePath, prevInputs, numWorkers=1, engine="postings"):
+    """
+    Updates the dictionary of alignments of the previous run, stored
+    in alignFilePath, to the current alignment inputs. Only the wncodes
+    whose candidate defkeys were added, removed or changed since the
+    run whose inputs are prevInputs are aligned again; the other
+    alignments are kept. The result is the same as getAlignStats.
+    """
+    global dictAlignments
 
+    dictPrevAlign = gen_utils.loadAlignments(alignFilePath)
+    prevWkDef, _, _, prevWnTrans = prevInputs
 
+    changedDefKeys = getChangedDefKeys(prevInputs)
+    affectedWncodes = getAffectedWncodes(changedDefKeys, prevInputs)
+    logger.info("Changed defkeys: %d; wncodes to align again: %d", len(changedDefKeys), len(affectedWncodes))
 
+    dictAlignments = {}
+    for pos in dict.fromkeys(posMap.values()):
+        defKeys = [ k for k, v in dictWkDef.items() if v.pos==pos ]
+        wnKeys = [ k for k, v in dictWnTrans.items() if v[0].pos == pos]
+        prevDefKeys = [ k for k, v in prevWkDef.items() if v.pos==pos ]
+        # ties in the sorted alignments follow the defkey order,
+        # so the kept alignments are only valid if it is unchanged
+        if isOrderKept(defKeys, prevDefKeys):
+            alignKeys = [ k for k in wnKeys if k in affectedWncodes ]
+        else:
+            logger.info("Order of the %s defkeys changed; aligning all the %s synsets", pos, pos)
+            alignKeys = wnKeys
+        dictAlign = {}
+        computeAlignmentStats(alignKeys, defKeys, dictAlign, numWorkers, engine)
+        alignKeys = set(alignKeys)
+        # merge in wnKeys order, for the same result as getAlignStats
+        for wncode in wnKeys:
+            if wncode in alignKeys:
+                if wncode in dictAlign:
+                    dictAlignments[wncode] = dictAlign[wncode]
+            elif wncode in dictPrevAlign:
+                dictAlignments[wncode] = [ def_keys.binaryRecord(rec) for rec in dictPrevAlign[wncode] ]
+        print("Number of", pos, "synsets aligned again:", len(alignKeys), "of", len(wnKeys))
+    gen_utils.dumpAlignments(dictAlignments, alignFilePath)
@@ -0,0 +1,78 @@
+import hashlib
+from collections.abc import Mapping
+
+
+class DefKeyMemo:
+    """
+    Computes the defkeys of the DBnary definitions: the 20-byte SHA1
+    digest of the language code, word, POS and short gloss. The digest
+    of each (langCode, word, pos, shortGloss) is computed once. Two
+    different hash inputs with the same digest raise a ValueError.
+    """
+
+    def __init__(self):
+        self.dictKeys = {}     # key is (langCode, word, pos, shortGloss); value is the defkey
+        self.dictInputs = {}   # key is the defkey; value is its first (langCode, word, pos, shortGloss)
+
+    def __len__(self):
+        return len(self.dictKeys)
+
+    def getKey(self, langCode, word, pos, shortGloss):
+        inputs = (langCode, word, pos, shortGloss)
+        defkey = self.dictKeys.get(inputs)
+        if defkey is None:
+            defkey = hashlib.sha1( getHashInput(*inputs).encode(encoding='utf-8') ).digest()
+            prevInputs = self.dictInputs.setdefault(defkey, inputs)
+            # different fields can join into the same hash input, and share a defkey
+            if prevInputs is not inputs and getHashInput(*prevInputs) != getHashInput(*inputs):
+                raise ValueError("Defkey collision: %r and %r" % (prevInputs, inputs))
+            self.dictKeys[inputs] = defkey
+        return defkey
+
+
+def getHashInput(langCode, word, pos, shortGloss):
+    return langCode+"-"+word+"-"+pos+"-"+shortGloss
+
+
+def hexKey(key):
+    """Returns the hex form of a binary defkey, in which it is exported;
+    other keys are returned unchanged."""
+    return key.hex() if isinstance(key, bytes) else key
+
+
+def binaryKey(key):
+    """Returns the binary defkey of its exported hex form."""
+    return bytes.fromhex(key) if isinstance(key, str) else key
+
+
+def hexRecord(rec):
+    """Returns an AlignStatsRecord with the hex form of its defkey."""
+    return rec._replace(defkey=hexKey(rec.defkey)) if isinstance(rec.defkey, bytes) else rec
+
+
+def binaryRecord(rec):
+    """Returns an AlignStatsRecord with the binary form of its defkey."""
+    return rec._replace(defkey=binaryKey(rec.defkey)) if isinstance(rec.defkey, str) else rec
+
+
+class BinaryKeyDict(Mapping):
+    """
+    Read-only view, with binary defkeys, of a dictionary loaded from an
+    exported artifact, whose defkeys are in hex form.
+    """
+
+    def __init__(self, hexDict):
+        self.hexDict = hexDict
+
+    def __getitem__(self, key):
+        return self.hexDict[hexKey(key)]
+
+    def __contains__(self, key):
+        return hexKey(key) in self.hexDict
+
+    def __iter__(self):
+        for key in self.hexDict:
+            yield binaryKey(key)
+
+    def __len__(self):
+        return len(self.hexDict)
@@ -1,21 +1,68 @@
 from collections import namedtuple
 
 
-# record structures for DBnary data extraction
+# record structures for DBnary data extraction; the disambiguation
+# lists default to one shared empty tuple
 TranslationRecord = namedtuple('TranslationRecord',
-                               "srcLexEntryKey, headword, pos, srcLangCode, tgtLangCode, gloss, lexId, writtenForm, usage, lineNum, disambSenseList")
+                               "srcLexEntryKey, headword, pos, srcLangCode, tgtLangCode, gloss, lexId, writtenForm, usage, lineNum, disambSenseList",
+                               defaults=((),))
 
 LexEntryRecord = namedtuple('LexEntryRecord', 'lemma, lexinfoPos, dbPos, synonymList, senseList')
-SenseRecord = namedtuple('SenseRecord', 'lemma, senseId, synonymList, definition, disambTranslationList')
+SenseRecord = namedtuple('SenseRecord', 'lemma, senseId, synonymList, definition, disambTranslationList',
+                         defaults=((),))
 SynonymRecord = namedtuple('SynonymRecord', 'word, lexEntryKey, gloss, lineNum')
 
 
 # data structures for synset alignment comparisons
-DByDefRecord = namedtuple('DByDefRecord', "ignore, srcLang, word, pos, longPos, gloss, longDef, lineNumList")   # key is defkey
+# key is defkey; lineNumList is the line number of the definition, or the
+# tuple of its line numbers when there are several (see getLineNums)
+DByDefRecord = namedtuple('DByDefRecord', "ignore, srcLang, word, pos, longPos, gloss, longDef, lineNumList")
 WnDByTransRecord = namedtuple('WnDByTransRecord', "lemma, lang, pos, ignore")   # key is wncode or defkey to a list of these records
 
+def getLineNums(lineNumList):
+    """Returns the line numbers of a DByDefRecord.lineNumList as a tuple."""
+    return (lineNumList,) if isinstance(lineNumList, int) else tuple(lineNumList)
+
 # data structures for sense alignments
 AlignStatsRecord = namedtuple('AlignStatsRecord', "defkey, srcMatch, langMatch, srcMax, langMax, srcPc, langPc, score, isCand")  # key is wncode
 
+# thresholds of the candidate alignments: langPc >= langPc, or srcPc >= srcPc
+# and either langPc >= srcLangPc, or langPc >= minLangPc and langMatch > minLangMatch
+CandThresholds = namedtuple('CandThresholds', "langPc, srcPc, srcLangPc, minLangPc, minLangMatch",
+                            defaults=(0.7, 0.5, 0.5, 0.45, 5))
+
 # data structure for wordnet sense definition
 WnSenseDef = namedtuple('WnSenseDef', "wncode, lang, definition")
+
+# record read from the DBnary dump: a run of non-blank lines (stripped),
+# or a stray line outside of a record (prefix is empty)
+DByRecord = namedtuple('DByRecord', "firstLineNum, prefix, lines")
+
+# position in the decompressed DBnary dump from which reading can resume:
+# the stream offset and line number of the next record, and the bit offset
+# and stream offset of the bz2 block holding it (blockBit is None when the
+# block is not known)
+DByReadPosition = namedtuple('DByReadPosition', "offset, lineNum, blockBit, blockOffset")
+
+
+class RecordBucket(tuple):
+    """
+    Frozen list of the lemma records of a wncode or defkey, in insertion
+    order; the lists of dictWkTrans and dictWkSynm hold distinct records.
+    The membership tests of the larger buckets use a set of the records,
+    built on first use.
+    """
+
+    SET_MIN_SIZE = 8   # smaller buckets are scanned
+
+    def __contains__(self, rec):
+        if len(self) < RecordBucket.SET_MIN_SIZE:
+            return tuple.__contains__(self, rec)
+        recSet = self.__dict__.get("recSet")
+        if recSet is None:
+            recSet = self.__dict__["recSet"] = frozenset(self)
+        return rec in recSet
+
+    def __reduce__(self):
+        # the set is not pickled
+        return (RecordBucket, (tuple(self),))
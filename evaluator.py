@@ -1,10 +1,24 @@
+import os
+import sys
 import itertools
+import multiprocessing
+import concurrent.futures
 import gen_utils as genutils
 import collections
 import wordnet_read as wn
 from ds import *
 import re
-import random
+from array import array
+import numpy as np
+import artifact_store
+import align_export
+
+
+ALIGN_FILENAMES = [ "align-%s.p" % pos for pos in "arvn" ]   # alignment files read by default
+EVAL_SHARDS_PER_WORKER = 4   # shards of the alignments per worker process in the parallel evaluation
+
+# lemma dictionaries (dictWnTrans, dictWkTrans, dictWkSynm) of an evaluation worker process
+workerLemmaDicts = None
 
 def getLangs(listTuples):
    langs = [ v.lang for v in listTuples]
@@ -19,36 +33,26 @@ def getSetLangs(dictListTuples):
 
 
 def getWnStats():
-    dictWnTrans2 = genutils.loadWnTranslations()
-    dictWnTrans = {}
-    for k, v in dictWnTrans2.items():
-        if k.endswith("n"):
-            pass
-        else:
-            dictWnTrans[k] = v
-
-    print("Size of wn translations:", len(dictWnTrans))
-    print("Size of flat list of translations:", sum([len(v) for v in list(dictWnTrans.values())]))
-
-    # find the set of language codes
-    flatList = [item for sublist in list(dictWnTrans.values()) for item in sublist]
-    langs = sorted( set( [ vv.lang for vv in flatList] ) )
-    #print("Number of languages: ", len(langs))
-    #print(langs)
-
-    # get the list of list of langs
-    listOfSublists =  [ getLangs(v) for v in list( dictWnTrans.values())  ]
-    #print("Number of sublists:", len(listOfSublists))
-    #print("First sublist:", listOfSublists[0])
+    """
+    Returns the number of synsets and of senses of each language in
+    the wordnet translations, the noun synsets excepted, from the
+    dictWnStats.json sidecar saved with them (or, for the dumps of
+    earlier runs, counted from the translations).
+    """
+    dictWnStats = genutils.loadWnStats()
+    if dictWnStats is None:
+        dictWnStats = wn.getWnTransStats(genutils.loadWnTranslations())
+    poss = [ pos for pos in dictWnStats["synsets"] if pos != "n" ]
+
+    print("Size of wn translations:", sum([ dictWnStats["synsets"][pos] for pos in poss ]))
+    print("Size of flat list of translations:", sum([ sum(dictWnStats["langSenses"][pos].values()) for pos in poss ]))
 
     # get the number of senses, number of synsets for each lang
-    counters = [ collections.Counter(v) for v in listOfSublists ]
-    #print("counters[0]:", counters[0])
-    dictSynsetCounts= {}
-    dictSenseCounts=collections.Counter([vv.lang for vv in flatList])
-    for lang in langs:
-        dictSynsetCounts[lang] = sum([ 1 for counter in counters if (lang in counter) ])
-        #print(lang, dictSynsetCounts[lang], dictSenseCounts.get(lang, 0))
+    dictSynsetCounts = collections.Counter()
+    dictSenseCounts = collections.Counter()
+    for pos in poss:
+        dictSynsetCounts.update(dictWnStats["langSynsets"][pos])
+        dictSenseCounts.update(dictWnStats["langSenses"][pos])
 
     return dictSynsetCounts, dictSenseCounts
 
@@ -85,11 +89,154 @@ def getLangNames(filename):
     langFile.close()
     return dictLang
 
-def wnBasedEvaluate():
-
-    dictWnTrans = genutils.loadWnTranslations()
-    dictWkTrans = genutils.loadWiktTranslations()
-    dictWkSynm = genutils.loadWiktSynonyms()
+class LangCounts:
+    """
+    Counts of lemmas by row (a wncode or a defkey) and language,
+    accumulated as (row, language id) pairs, and turned into a
+    rows x languages count matrix by getMatrix.
+    """
+
+    def __init__(self, dictLangIds):
+        self.dictLangIds = dictLangIds   # shared language ids, in order of first use
+        self.rowIds = array('q')
+        self.langIds = array('q')
+        self.numRows = 0
+
+    def addRow(self, lemmas):
+        """Counts the languages of the lemmas in a new row."""
+        row = self.numRows
+        self.numRows += 1
+        for lem in lemmas:
+            self.rowIds.append(row)
+            self.langIds.append(self.dictLangIds.setdefault(lem.lang, len(self.dictLangIds)))
+
+    def getMatrix(self):
+        numLangs = len(self.dictLangIds)
+        flatIds = np.frombuffer(self.rowIds, dtype=np.int64)*numLangs + np.frombuffer(self.langIds, dtype=np.int64)
+        return np.bincount(flatIds, minlength=self.numRows*numLangs).reshape(self.numRows, numLangs)
+
+
+def loadLemmaDictionaries(dbFilePath=""):
+    """Returns dictWnTrans, dictWkTrans and dictWkSynm, read from the
+    SQLite artifact store with dbFilePath."""
+    if dbFilePath:
+        views = artifact_store.getArtifactViews(artifact_store.openArtifactStore(dbFilePath))
+        return views["wn_trans"], views["wk_trans"], views["wk_synm"]
+    return genutils.loadWnTranslations(), genutils.loadWiktTranslations(), genutils.loadWiktSynonyms()
+
+
+def countAlignedLemmas(alignedItems, dictWnTrans, dictWkTrans, dictWkSynm):
+    """
+    Counts by language the lemmas of the alignments in alignedItems,
+    a list of (wncode, alignedList). Returns the languages, in column
+    order, the column sums of the overlap, set overlap, Wiktionary and
+    wordnet count matrices of the synsets, and the defkeys counted with
+    their count matrix.
+    """
+    dictLangIds = {}
+    overlapCounts = LangCounts(dictLangIds)
+    setOverlapCounts = LangCounts(dictLangIds)
+    wkCounts = LangCounts(dictLangIds)
+    wnCounts = LangCounts(dictLangIds)
+    wkCountsByDefKey = LangCounts(dictLangIds)
+    defKeysCounted = {}
+
+    for wncode, alignedList in alignedItems:
+        # unpack all the wikt lemmas to a flat merged list
+        mergedWktLemmas = []
+        for v in alignedList:
+            synmList = dictWkSynm.get(v.defkey, ())
+            transList = dictWkTrans.get(v.defkey, ())
+            mergedWktLemmas.extend( synmList )
+            mergedWktLemmas.extend( transList )
+            if v.defkey not in defKeysCounted:
+                defKeysCounted[v.defkey] = None
+                wkCountsByDefKey.addRow(itertools.chain(synmList, transList))
+        # select the items from the merged list which also
+        # occur in the wn list
+        # First, get the wn translations
+        wnLemmas = dictWnTrans[wncode]
+        overlapCounts.addRow([lem for lem in mergedWktLemmas if lem in wnLemmas])
+        setOverlapCounts.addRow([lem for lem in set(mergedWktLemmas) if lem in wnLemmas])
+        wkCounts.addRow(mergedWktLemmas)
+        wnCounts.addRow(wnLemmas)
+
+    return { "langs": list(dictLangIds),
+             "overlap": overlapCounts.getMatrix().sum(axis=0),
+             "setOverlap": setOverlapCounts.getMatrix().sum(axis=0),
+             "wk": wkCounts.getMatrix().sum(axis=0),
+             "wn": wnCounts.getMatrix().sum(axis=0),
+             "defKeys": list(defKeysCounted),
+             "defKeyCounts": wkCountsByDefKey.getMatrix() }
+
+
+def reduceLangCounts(partialCounts):
+    """
+    Sums the partial counts of countAlignedLemmas by language, into a
+    Counter for each of overlap, setOverlap, wk, wn, wkSenses and
+    wkSynsets. A defkey counted in several partial counts is only
+    counted in the first one.
+    """
+    dictTotals = { name: collections.Counter()
+                   for name in ("overlap", "setOverlap", "wk", "wn", "wkSenses", "wkSynsets") }
+    defKeysCounted = set()
+    for counts in partialCounts:
+        langs = counts["langs"]
+        for name in ("overlap", "setOverlap", "wk", "wn"):
+            dictTotals[name].update(dict(zip(langs, counts[name].tolist())))
+        newRows = [ row for row, defkey in enumerate(counts["defKeys"]) if defkey not in defKeysCounted ]
+        defKeysCounted.update(counts["defKeys"])
+        defKeyCounts = counts["defKeyCounts"][newRows]
+        dictTotals["wkSenses"].update(dict(zip(langs, defKeyCounts.sum(axis=0).tolist())))
+        dictTotals["wkSynsets"].update(dict(zip(langs, (defKeyCounts > 0).sum(axis=0).tolist())))
+    return dictTotals
+
+
+def initEvalWorker(dbFilePath):
+    """Loads the lemma dictionaries of an evaluation worker process."""
+    global workerLemmaDicts
+
+    workerLemmaDicts = loadLemmaDictionaries(dbFilePath)
+
+
+def countShard(alignedItems):
+    """Counts the lemmas of one shard of the alignments in a worker process."""
+    return countAlignedLemmas(alignedItems, *workerLemmaDicts)
+
+
+def countLemmasInParallel(dictAlignments, dbFilePath, numWorkers):
+    """
+    Splits the alignments into shards of consecutive wncodes, counts
+    the lemmas of each shard in a process pool, and returns the partial
+    counts in shard order.
+    """
+    alignedItems = list(dictAlignments.items())
+    numShards = min(len(alignedItems), numWorkers*EVAL_SHARDS_PER_WORKER)
+    shardSize = -(-len(alignedItems) // numShards)
+    shards = [ alignedItems[i:i+shardSize] for i in range(0, len(alignedItems), shardSize) ]
+    print("Evaluating", len(alignedItems), "synsets in", len(shards), "shards with", numWorkers, "workers")
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        mpContext = multiprocessing.get_context("fork")
+    else:
+        mpContext = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers, mp_context=mpContext,
+                                                initializer=initEvalWorker, initargs=(dbFilePath,)) as executor:
+        return list(executor.map(countShard, shards))
+
+
+def wnBasedEvaluate(dbFilePath="", numWorkers=1, alignFileNames=ALIGN_FILENAMES):
+    """
+    Computes the wn-based evaluation statistics. With dbFilePath, the
+    alignments and the lemmas are read from the SQLite artifact store,
+    querying only the rows of the aligned synsets and defkeys. The
+    lemmas are counted once in synset and defkey by language count
+    matrices, and the statistics of each language are column sums.
+    With numWorkers > 1, shards of the alignments are counted in a
+    process pool, and their counts summed. Without dbFilePath, the
+    alignments are read from the files of alignFileNames.
+    """
+    dictWnTrans, dictWkTrans, dictWkSynm = loadLemmaDictionaries(dbFilePath)
 
 
     StatsRec = collections.namedtuple("StatsRec", "numMatchedVsWn, numMatchedVsWk, "
@@ -97,69 +244,48 @@ def wnBasedEvaluate():
                                                   "wnTotal, wkTotal, "
                                                   "recall, precision, "
                                                   "numSynsets, numSenses")
-    dictOverlapCounts = {}
-    dictSetOverlapCounts = {}
-    dictWkCounts = {}
-    dictWnCounts = {}
     dictResultStats = {}
-    dictWkCountsByDefKey = {}
 
     #dictSynsetCounts, dictSenseCounts = getWnStats()
-    listOfDefKeysAligned = []
 
     dictAlignments={}
-    dictAlignments = genutils.loadAlignments("align-n.p")
-    dictv = genutils.loadAlignments("align-v.p")
-    dictr = genutils.loadAlignments("align-r.p")
-    dicta = genutils.loadAlignments("align-a.p")
-    dictAlignments.update(dictv)
-    dictAlignments.update(dictr)
-    dictAlignments.update(dicta)
+    if dbFilePath:
+        dictAlignments = artifact_store.getArtifactViews(artifact_store.openArtifactStore(dbFilePath))["alignment"]
+    else:
+        # chained rather than merged, so that the alignments stay lazily loaded;
+        # lookups and iteration order are those of the merged dictionary
+        dictAlignments = collections.ChainMap(*[ genutils.loadAlignments(fileName)
+                                                 for fileName in alignFileNames ])
     print("Size of dictAlignments:", len(dictAlignments))
 
-
-    for wncode, alignedList in dictAlignments.items():
-        # unpack all the wikt lemmas to a flat merged list
-        mergedWktLemmas = []
-        for v in alignedList:
-            thisList = dictWkSynm.get(v.defkey, []) + dictWkTrans.get(v.defkey, [])
-            mergedWktLemmas.extend( thisList )
-            listOfDefKeysAligned.append(v.defkey)
-            if v.defkey not in dictWkCountsByDefKey:
-                dictWkCountsByDefKey[v.defkey] = collections.Counter([lem.lang for lem in thisList ])
-        # select the items from the merged list which also
-        # occur in the wn list
-        # First, get the wn translations
-        wnLemmas = dictWnTrans[wncode]
-        overlapWkLangs = [lem.lang for lem in mergedWktLemmas if lem in wnLemmas]
-        overlapSetWkLangs = [lem.lang for lem in set(mergedWktLemmas) if lem in wnLemmas]
-        dictOverlapCounts[wncode] = collections.Counter(overlapWkLangs)
-        dictSetOverlapCounts[wncode] = collections.Counter(overlapSetWkLangs)
-        dictWkCounts[wncode] = collections.Counter([lem.lang for lem in mergedWktLemmas])
-        dictWnCounts[wncode] = collections.Counter([lem.lang for lem in wnLemmas])
-
+    if numWorkers > 1 and len(dictAlignments) > 1:
+        partialCounts = countLemmasInParallel(dictAlignments, dbFilePath, numWorkers)
+    else:
+        partialCounts = [ countAlignedLemmas(dictAlignments.items(), dictWnTrans, dictWkTrans, dictWkSynm) ]
+    dictTotals = reduceLangCounts(partialCounts)
 
 
     # get the stats by lang based on the languages in wn
     # First, get the langs in wn
-    wnLangs = list(getSetLangs(dictWnTrans))
+    if dbFilePath:
+        wnLangs = dictWnTrans.getLangs()
+    else:
+        wnLangs = list(getSetLangs(dictWnTrans))
     wkLangs = []   #getWkLangs(dictWkTrans, dictWkSynm)
     allLangs = sorted( set( wnLangs + wkLangs ) )
     print("Number of wkLangs: ", len(wkLangs), sorted(wkLangs))
     print("Number of wnLangs: ",len(wnLangs), sorted(wnLangs) )
     print("Number of allLangs: ",len(allLangs), sorted(allLangs) )
 
-    grandTotalWkOverlaps = sum( [ sum(dictCount.values()) for wncode, dictCount in dictOverlapCounts.items() ])
-    grandTotalWk = sum( [ sum(dictCount.values()) for wncode, dictCount in dictWkCounts.items() ])
-    grandTotalWn = sum( [ sum(dictCount.values()) for wncode, dictCount in dictWnCounts.items() ])
+    grandTotalWkOverlaps = sum(dictTotals["overlap"].values())
+    grandTotalWk = sum(dictTotals["wk"].values())
     for lang in allLangs:
-        #numWkSynsets = sum([ 1 for defkey in set(listOfDefKeysAligned) if dictWkCountsByDefKey[defkey].get(lang, 0) > 0 ] )
-        numWkSynsets = sum([1 for defkey, dictCount in dictWkCountsByDefKey.items() if dictCount.get(lang, 0) > 0])
-        numWkSenses = sum([dictCount.get(lang, 0) for defkey, dictCount in dictWkCountsByDefKey.items()])
-        totalMatchedVsWk = sum([dictCount.get(lang, 0) for wncode, dictCount in dictOverlapCounts.items()])
-        totalMatchedVsWn = sum([dictCount.get(lang, 0) for wncode, dictCount in dictSetOverlapCounts.items()])
-        totalWk = sum([dictCount.get(lang, 0) for wncode, dictCount in dictWkCounts.items()])
-        totalWn = sum( [dictCount.get(lang, 0) for wncode, dictCount in dictWnCounts.items()])
+        numWkSynsets = dictTotals["wkSynsets"][lang]
+        numWkSenses = dictTotals["wkSenses"][lang]
+        totalMatchedVsWk = dictTotals["overlap"][lang]
+        totalMatchedVsWn = dictTotals["setOverlap"][lang]
+        totalWk = dictTotals["wk"][lang]
+        totalWn = dictTotals["wn"][lang]
         if totalWn > 0:
           recall = float(format(totalMatchedVsWn/totalWn, '.5f'))
         else:
@@ -203,66 +329,82 @@ def wnBasedEvaluate():
     return dictAlignments, dictWnTrans, dictWkTrans, dictWkSynm
 
 
-def printAlignments(dictAlign, dictWnTrans, dictWkTrans, dictWkSynm, filename, numAlign):
-    dictWkDef = genutils.loadWiktDefinitions()
-    sortedKeys = sorted(dictAlign.keys())
-    randomIndx = range(0, numAlign)
-    random.seed(12345)
-    randomIndx = random.sample(range(0, len(dictAlign)), numAlign)
-    fh = open(filename, "w", encoding='utf-8')
-    printCount = 0
-    for k in randomIndx:
-        v = dictAlignments[sortedKeys[k]]
-        wncode = sortedKeys[k]
-        printCount +=1
-        fh.write("Record"+str(printCount)+"  wncode: "+wncode+"\n")
-        fh.write(str(dictWnTrans[wncode]).replace("),", "),\n"))
-        fh.write("\n")
-        for wd in v:
-            defkey = wd.defkey
-            fh.write(str(wd))
-            fh.write("\n")
-            fh.write(str(dictWkDef[defkey]))
-            fh.write("\n")
-            fh.write("Synonyms:")
-            fh.write("\n")
-            if defkey in dictWkSynm:
-                fh.write(str(dictWkSynm[defkey]).replace("),", "),\n"))
-            else:
-                fh.write("No synonyms\n")
-            fh.write("\n")
-            fh.write("Translations:"+"\n")
-            if defkey in dictWkTrans:
-                fh.write(str(dictWkTrans[defkey]).replace("),", "),\n"))
-            else:
-                fh.write("No translations\n")
-            fh.write("\n")
+def formatRecords(recList):
+    """Returns the list of the records, one record per line."""
+    return "[" + ",\n ".join(map(str, recList)) + "]"
+
+
+def printAlignments(dictAlign, dictWnTrans, dictWkTrans, dictWkSynm, filename, numAlign, dictWkDef=None):
+    """
+    Writes the alignments of a reservoir sample of numAlign synsets of
+    dictAlign, with their lemmas and definitions, one synset at a time.
+    The sample is drawn from the keys, so that only the alignments of the
+    sampled synsets are read.
+    """
+    if dictWkDef is None:
+        dictWkDef = genutils.loadWiktDefinitions()
+    sample = align_export.reservoirSample(iter(dictAlign), numAlign)
+    with open(filename, "w", encoding='utf-8') as fh:
+        for printCount, wncode in enumerate(sample, 1):
+            v = dictAlign[wncode]
+            fh.write("Record"+str(printCount)+"  wncode: "+wncode+"\n")
+            fh.write(formatRecords(dictWnTrans[wncode]))
             fh.write("\n")
-
-    fh.close()
-
-
-
-
-# main script from here ----
-
-# get the Wordnet counts for synsets and senses
-dictSynsetCounts, dictSenseCounts = getWnStats()
-printCounters(dictSynsetCounts, dictSenseCounts, "Lang, WnSynsets, WnSenses")
-
-# get statistics for wn-based alignment evaluation
-# assumes that alignment pickled dictionaries in align-n.p, align-r.p,
-# align-v.p and align-a.p are in the same directory as the script
-dictAlignments, dictWnTrans, dictWkTrans, dictWkSynm = wnBasedEvaluate()
-# print out a random sample of the alignments and match stats
-printAlignments(dictAlignments, dictWnTrans, dictWkTrans, dictWkSynm, "align-results-sample.txt", 20)
-
-
-
-
-
-
-
-
-
-
+            for wd in v:
+                defkey = wd.defkey
+                fh.write(str(wd))
+                fh.write("\n")
+                defRec = dictWkDef[defkey]
+                fh.write(str(defRec._replace(lineNumList=list(getLineNums(defRec.lineNumList)))))
+                fh.write("\n")
+                fh.write("Synonyms:")
+                fh.write("\n")
+                if defkey in dictWkSynm:
+                    fh.write(formatRecords(dictWkSynm[defkey]))
+                else:
+                    fh.write("No synonyms\n")
+                fh.write("\n")
+                fh.write("Translations:"+"\n")
+                if defkey in dictWkTrans:
+                    fh.write(formatRecords(dictWkTrans[defkey]))
+                else:
+                    fh.write("No translations\n")
+                fh.write("\n")
+                fh.write("\n")
+
+
+
+
+def main(dbFilePath="", numWorkers=1, export=False, alignFileNames=ALIGN_FILENAMES):
+    """
+    Prints the wordnet counts and the wn-based evaluation statistics,
+    and writes a random sample of the alignments; with export, all the
+    alignments are also exported with their context.
+    """
+    # get the Wordnet counts for synsets and senses
+    dictSynsetCounts, dictSenseCounts = getWnStats()
+    printCounters(dictSynsetCounts, dictSenseCounts, "Lang, WnSynsets, WnSenses")
+
+    # get statistics for wn-based alignment evaluation
+    dictAlignments, dictWnTrans, dictWkTrans, dictWkSynm = wnBasedEvaluate(dbFilePath, numWorkers, alignFileNames)
+    # print out a random sample of the alignments and match stats
+    if dbFilePath:
+        dictWkDef = artifact_store.getArtifactViews(artifact_store.openArtifactStore(dbFilePath))["wk_def"]
+    else:
+        dictWkDef = genutils.loadWiktDefinitions()
+    printAlignments(dictAlignments, dictWnTrans, dictWkTrans, dictWkSynm, "align-results-sample.txt", 20, dictWkDef)
+    if export:
+        align_export.exportAlignments(dictAlignments, dictWnTrans, dictWkTrans, dictWkSynm, dictWkDef, "align-results.tsv")
+        align_export.exportAlignments(dictAlignments, dictWnTrans, dictWkTrans, dictWkSynm, dictWkDef,
+                                      "align-results-sample.jsonl", 20)
+
+
+if __name__ == "__main__":
+    # assumes that alignment pickled dictionaries in align-n.p, align-r.p,
+    # align-v.p and align-a.p are in the same directory as the script,
+    # or, with --sqlite, that the artifact store artifacts.db is
+    # --parallel counts the alignments in one worker process per core
+    # --export also writes all the alignments, and the sample, with their context
+    main("artifacts.db" if "--sqlite" in sys.argv[1:] else "",
+         os.cpu_count() if "--parallel" in sys.argv[1:] else 1,
+         "--export" in sys.argv[1:])
@@ -1,6 +1,14 @@
+import os
 import sys
+import json
+import mmap
 import pickle
+import functools
+from array import array
+from collections.abc import Mapping, ItemsView, ValuesView
 import ds
+import columnar_store
+import def_keys
 
 
 def uprint(*objects,  sep=' ', end='\n', file=sys.stdout):
@@ -12,63 +20,172 @@ def uprint(*objects,  sep=' ', end='\n', file=sys.stdout):
         print(*map(f, objects), sep=sep, end=end, file=file)
 
 
-def loadWiktTranslations():
-    with open( "dictWkTrans.p", "rb" ) as f:
-        dictWkTrans = pickle.load( f )
-        f.close()
-    return dictWkTrans
-
-def loadWiktSynonyms():
-    with open( "dictWkSynm.p", "rb" ) as f:
-        dictWkSynm = pickle.load( f )
-        f.close()
-    return dictWkSynm
-
-def loadWnTranslations():
-    with open( "dictWnTrans.p", "rb" ) as f:
-        dictWnTrans = pickle.load( f )
-        f.close()
-    return dictWnTrans
-
-def loadWiktDefinitions():
-    with open( "dictWkDef.p", "rb" ) as f:
-        dictWkDef = pickle.load( f )
-        f.close()
-    return dictWkDef
-
-
-def dumpWiktTranslations(dictWkTrans):
-    with open( "dictWkTrans.p", "wb" ) as f:
-        pickle.dump( dictWkTrans, f  )
-        f.close()
-    return "dictWkTrans.p"
-
-def dumpWiktSynonyms(dictWkSynm):
-    with open( "dictWkSynm.p", "wb" ) as f:
-        pickle.dump( dictWkSynm, f )
-        f.close()
-    return "dictWkSynm.p"
-
-def dumpWnTranslations(dictWnTrans):
-    with open( "dictWnTrans.p", "wb" ) as f:
-        pickle.dump( dictWnTrans, f )
-        f.close()
-    return "dictWnTrans.p"
-
-def dumpWiktDefinitions(dictWkDef):
-    with open( "dictWkDef.p", "wb" ) as f:
-        pickle.dump( dictWkDef, f )
-        f.close()
-    return "dictWkDef.p"
+INDEXED_PICKLE_MAGIC = b"DBYIDXP1"
+LAZY_CACHE_SIZE = 4096   # values kept in the LRU cache of a lazy dictionary
 
-def dumpAlignments(dictAlign, fileName):
-    with open(fileName, "wb") as f:
-        pickle.dump(dictAlign, f)
-        f.close()
+
+def dumpIndexedPickle(dictToSave, fileName):
+    """
+    Pickles a dictionary value by value, followed by the index of the
+    keys and of the byte offsets of their values, so that it can be
+    loaded lazily with LazyPickleDict. The last 8 bytes of the file
+    hold the offset of the index.
+    """
+    tmpFileName = fileName + ".tmp"
+    keys = []; offsets = array('q')
+    with open(tmpFileName, "wb") as f:
+        f.write(INDEXED_PICKLE_MAGIC)
+        for key, value in dictToSave.items():
+            keys.append(key)
+            offsets.append(f.tell())
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        indexOffset = f.tell()
+        offsets.append(indexOffset)
+        pickle.dump((keys, offsets), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.write(indexOffset.to_bytes(8, 'little'))
+    os.replace(tmpFileName, fileName)
+    return fileName
+
+
+class LazyItemsView(ItemsView):
+    def __iter__(self):
+        store = self._mapping
+        for i, key in enumerate(store.keyList):
+            yield key, store.getValue(i)
+
+
+class LazyValuesView(ValuesView):
+    def __iter__(self):
+        store = self._mapping
+        for i in range(len(store.keyList)):
+            yield store.getValue(i)
+
+
+class LazyPickleDict(Mapping):
+    """
+    Read-only dictionary over a file saved by dumpIndexedPickle. Only
+    the index is loaded; each value is unpickled from the memory-mapped
+    file on first access, and kept in a bounded LRU cache.
+    """
+
+    def __init__(self, fileName, cacheSize=LAZY_CACHE_SIZE):
+        self.fileName = fileName
+        with open(fileName, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        indexOffset = int.from_bytes(self.mm[-8:], 'little')
+        self.keyList, self.offsets = pickle.loads(self.mm[indexOffset:-8])
+        self.dictIndex = { key: i for i, key in enumerate(self.keyList) }
+        self.getValue = functools.lru_cache(maxsize=cacheSize)(self.readValue)
+
+    def __reduce__(self):
+        return (LazyPickleDict, (self.fileName,))
+
+    def readValue(self, i):
+        return pickle.loads(self.mm[self.offsets[i]:self.offsets[i+1]])
+
+    def __getitem__(self, key):
+        return self.getValue(self.dictIndex[key])
+
+    def __contains__(self, key):
+        return key in self.dictIndex
+
+    def __iter__(self):
+        return iter(self.keyList)
+
+    def __len__(self):
+        return len(self.keyList)
+
+    def items(self):
+        return LazyItemsView(self)
+
+    def values(self):
+        return LazyValuesView(self)
+
+
+def loadPickle(fileName):
+    """
+    Loads a pickled dictionary: lazily if it was saved with
+    dumpIndexedPickle, else as a whole.
+    """
+    with open( fileName, "rb" ) as f:
+        if f.read(len(INDEXED_PICKLE_MAGIC)) == INDEXED_PICKLE_MAGIC:
+            return LazyPickleDict(fileName)
+        f.seek(0)
+        return pickle.load( f )
+
+
+def loadDictionary(fileName):
+    """
+    Loads an intermediate dictionary: a read-only columnar store view,
+    or, for the pickled dumps of earlier runs (.p files), a dictionary.
+    """
+    if fileName.endswith(".p"):
+        return loadPickle(fileName)
+    return columnar_store.loadColumnar(fileName)
+
+def loadWiktTranslations(fileName="dictWkTrans.col"):
+    return loadDictionary(fileName)
+
+def loadWiktSynonyms(fileName="dictWkSynm.col"):
+    return loadDictionary(fileName)
+
+def loadWnTranslations(fileName="dictWnTrans.col"):
+    return loadDictionary(fileName)
+
+def loadWiktDefinitions(fileName="dictWkDef.col"):
+    return loadDictionary(fileName)
+
+
+def dumpWiktTranslations(dictWkTrans, fileName="dictWkTrans.col"):
+    return columnar_store.dumpColumnar(dictWkTrans, fileName)
+
+def dumpWiktSynonyms(dictWkSynm, fileName="dictWkSynm.col"):
+    return columnar_store.dumpColumnar(dictWkSynm, fileName)
+
+def dumpWnTranslations(dictWnTrans, fileName="dictWnTrans.col"):
+    return columnar_store.dumpColumnar(dictWnTrans, fileName)
+
+def dumpWiktDefinitions(dictWkDef, fileName="dictWkDef.col"):
+    return columnar_store.dumpColumnar(dictWkDef, fileName)
+
+def dumpWnStats(dictWnStats, fileName="dictWnStats.json"):
+    """Saves the statistics of the wordnet translations, the sidecar of dictWnTrans."""
+    tmpFileName = fileName + ".tmp"
+    with open(tmpFileName, "w", encoding='utf-8') as f:
+        json.dump(dictWnStats, f, sort_keys=True)
+    os.replace(tmpFileName, fileName)
     return fileName
 
+def loadWnStats(fileName="dictWnStats.json"):
+    """Returns the statistics of the wordnet translations, or None if there are none."""
+    if not os.path.exists(fileName):
+        return None
+    with open(fileName, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+def dumpAlignments(dictAlign, fileName):
+    """Saves a dictionary of alignments, with the defkeys in hex form."""
+    return dumpIndexedPickle({ wncode: [ def_keys.hexRecord(rec) for rec in statsList ]
+                               for wncode, statsList in dictAlign.items() }, fileName)
+
 def loadAlignments(fileName):
+    """Loads a dictionary of alignments, lazily (see LazyPickleDict)."""
+    return loadPickle(fileName)
+
+def dumpCheckpoint(checkpoint, fileName):
+    """Pickles the checkpoint, replacing the previous one only once it is complete."""
+    tmpFileName = fileName + ".tmp"
+    with open(tmpFileName, "wb") as f:
+        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmpFileName, fileName)
+    return fileName
+
+def loadCheckpoint(fileName):
+    """Returns the pickled checkpoint, or None if there is none."""
+    if not os.path.exists(fileName):
+        return None
     with open(fileName, "rb") as f:
-        dictAlign = pickle.load(f)
-        f.close()
-    return dictAlign
+        checkpoint = pickle.load(f)
+    return checkpoint
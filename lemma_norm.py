@@ -0,0 +1,23 @@
+import functools
+
+
+NORM_CACHE_SIZE = 1 << 20   # distinct forms kept in the normalization cache
+
+# the punctuation replaced by a space in the normalized lemmas
+NORM_PUNCT_TABLE = str.maketrans("-_()[]", "      ")
+
+
+@functools.lru_cache(maxsize=NORM_CACHE_SIZE)
+def normLemma(lemma):
+    """ Normalize lemma for purpose of comparison: lowercased, with
+        the punctuation of NORM_PUNCT_TABLE and the runs of whitespace
+        replaced by one space, and stripped. Normalizing a normalized
+        lemma returns it unchanged. The results are cached, since the
+        same forms recur across the translations and synonyms.
+    """
+    return " ".join(lemma.lower().translate(NORM_PUNCT_TABLE).split())
+
+
+def normLemmas(lemmas):
+    """Returns the list of the normalized lemmas, in the same order."""
+    return list(map(normLemma, lemmas))
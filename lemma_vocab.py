@@ -0,0 +1,197 @@
+import numpy as np
+
+
+class LemmaVocab:
+    """Maps each lemma record (lemma, lang, pos) to a dense int32 id."""
+
+    def __init__(self):
+        self.dictIds = {}     # key is the lemma record
+        self.records = []     # record for each id
+
+    def __len__(self):
+        return len(self.records)
+
+    def intern(self, rec):
+        """Returns the id of the record, adding it to the vocabulary if new."""
+        recId = self.dictIds.get(rec)
+        if recId is None:
+            recId = len(self.records)
+            self.dictIds[rec] = recId
+            self.records.append(rec)
+        return recId
+
+    def internList(self, recList):
+        """Returns the sorted array of the distinct ids of the records."""
+        ids = np.fromiter((self.intern(rec) for rec in recList), dtype=np.int32, count=len(recList))
+        return np.unique(ids)
+
+
+class InternedLemmaTable:
+    """
+    Stores the lemma records of each key (wncode or defkey) as sorted
+    arrays of distinct lemma ids, split into a source language part
+    and an other language part. The arrays of all keys are packed
+    into one id array and one offset array per part (CSR layout).
+    The record counts of the original lists are kept for the
+    srcMax/langMax computation.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.dictRows = {}     # key is wncode or defkey; value is the row
+        self.srcIds = None
+        self.srcOffsets = None
+        self.langIds = None
+        self.langOffsets = None
+        self.srcCounts = None
+        self.langCounts = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rowOf(self, key):
+        return self.dictRows[key]
+
+    def srcRow(self, row):
+        return self.srcIds[self.srcOffsets[row]:self.srcOffsets[row+1]]
+
+    def langRow(self, row):
+        return self.langIds[self.langOffsets[row]:self.langOffsets[row+1]]
+
+
+def packRows(rowArrays):
+    """Packs a list of id arrays into a CSR id array and offset array."""
+    offsets = np.zeros(len(rowArrays)+1, dtype=np.int64)
+    if rowArrays:
+        np.cumsum([len(a) for a in rowArrays], out=offsets[1:])
+        ids = np.concatenate(rowArrays).astype(np.int32, copy=False)
+    else:
+        ids = np.zeros(0, dtype=np.int32)
+    return ids, offsets
+
+
+def internWnTrans(dictWnTrans, srcLang, vocab):
+    """
+    Builds the interned table of the wordnet synsets. The source
+    part holds the lemmas in the source language, the other part
+    holds the lemmas in all the other languages.
+    """
+    table = InternedLemmaTable()
+    srcRows = []; langRows = []; srcCounts = []; langCounts = []
+    for wncode, recList in dictWnTrans.items():
+        srcRecs = [ rec for rec in recList if rec.lang == srcLang ]
+        langRecs = [ rec for rec in recList if rec.lang != srcLang ]
+        table.dictRows[wncode] = len(table.keys)
+        table.keys.append(wncode)
+        srcRows.append(vocab.internList(srcRecs))
+        langRows.append(vocab.internList(langRecs))
+        srcCounts.append(len(srcRecs))
+        langCounts.append(len(langRecs))
+    table.srcIds, table.srcOffsets = packRows(srcRows)
+    table.langIds, table.langOffsets = packRows(langRows)
+    table.srcCounts = np.array(srcCounts, dtype=np.int32)
+    table.langCounts = np.array(langCounts, dtype=np.int32)
+    return table
+
+
+def internWkTrans(defKeys, dictWkSynm, dictWkTrans, vocab):
+    """
+    Builds the interned table of the DBnary defkeys. The source
+    part holds the synonyms (dictWkSynm), the other part holds
+    the translations (dictWkTrans).
+    """
+    table = InternedLemmaTable()
+    srcRows = []; langRows = []; srcCounts = []; langCounts = []
+    for defkey in defKeys:
+        srcRecs = dictWkSynm.get(defkey, [])
+        langRecs = dictWkTrans.get(defkey, [])
+        table.dictRows[defkey] = len(table.keys)
+        table.keys.append(defkey)
+        srcRows.append(vocab.internList(srcRecs))
+        langRows.append(vocab.internList(langRecs))
+        srcCounts.append(len(srcRecs))
+        langCounts.append(len(langRecs))
+    table.srcIds, table.srcOffsets = packRows(srcRows)
+    table.langIds, table.langOffsets = packRows(langRows)
+    table.srcCounts = np.array(srcCounts, dtype=np.int32)
+    table.langCounts = np.array(langCounts, dtype=np.int32)
+    return table
+
+
+def gatherRows(ids, offsets, rows):
+    """
+    Gathers the id segments of the given rows into one array.
+    Returns the concatenated ids and the segment index of each id.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = offsets[rows]
+    lengths = offsets[rows+1] - starts
+    total = int(lengths.sum())
+    segIndex = np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+    if total == 0:
+        return np.zeros(0, dtype=ids.dtype), segIndex
+    # position of each gathered id within its own segment
+    segStarts = np.cumsum(lengths) - lengths
+    withinSeg = np.arange(total, dtype=np.int64) - np.repeat(segStarts, lengths)
+    return ids[np.repeat(starts, lengths) + withinSeg], segIndex
+
+
+def sortedOverlapCounts(queryIds, segIds, segIndex, numSegs):
+    """
+    Counts, for each segment, the number of its ids found in the
+    sorted array queryIds. Both the query and the segments must
+    hold distinct ids, so that the counts are intersection sizes.
+    """
+    if len(queryIds) == 0 or len(segIds) == 0:
+        return np.zeros(numSegs, dtype=np.int64)
+    pos = np.searchsorted(queryIds, segIds)
+    pos[pos == len(queryIds)] = 0
+    hits = queryIds[pos] == segIds
+    return np.bincount(segIndex[hits], minlength=numSegs)
+
+
+def buildIdPostings(ids, offsets, numIds):
+    """
+    Builds the postings of each lemma id: the sorted rows whose
+    segment holds the id, as a CSR row array and offset array
+    indexed by id.
+    """
+    rowOfId = np.repeat(np.arange(len(offsets)-1, dtype=np.int64), np.diff(offsets))
+    order = np.argsort(ids, kind="stable")
+    postingRows = rowOfId[order]
+    postingOffsets = np.zeros(numIds+1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=numIds), out=postingOffsets[1:])
+    return postingRows, postingOffsets
+
+
+def candidateRows(queryIds, postingRows, postingOffsets):
+    """Returns the sorted distinct rows found in the postings of the query ids."""
+    rows, _ = gatherRows(postingRows, postingOffsets, queryIds)
+    return np.unique(rows)
+
+
+def subTable(table, keys):
+    """Returns a new table holding only the rows of the given keys, in that order."""
+    rows = np.fromiter((table.rowOf(key) for key in keys), dtype=np.int64, count=len(keys))
+    sub = InternedLemmaTable()
+    sub.keys = list(keys)
+    sub.dictRows = { key: row for row, key in enumerate(sub.keys) }
+    srcIds, srcSeg = gatherRows(table.srcIds, table.srcOffsets, rows)
+    langIds, langSeg = gatherRows(table.langIds, table.langOffsets, rows)
+    sub.srcIds, sub.srcOffsets = srcIds, segOffsets(srcSeg, len(rows))
+    sub.langIds, sub.langOffsets = langIds, segOffsets(langSeg, len(rows))
+    sub.srcCounts = table.srcCounts[rows]
+    sub.langCounts = table.langCounts[rows]
+    return sub
+
+
+def segOffsets(segIndex, numSegs):
+    """Returns the CSR offsets of a sorted segment index array."""
+    offsets = np.zeros(numSegs+1, dtype=np.int64)
+    np.cumsum(np.bincount(segIndex, minlength=numSegs), out=offsets[1:])
+    return offsets
+
+
+def postingsLength(queryIds, postingOffsets):
+    """Returns the total length of the postings of the query ids."""
+    return int((postingOffsets[queryIds+1] - postingOffsets[queryIds]).sum())
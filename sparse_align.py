@@ -0,0 +1,153 @@
+import numpy as np
+import lemma_vocab
+from ds import AlignStatsRecord, CandThresholds
+
+try:
+    import scipy.sparse as sparse
+except ImportError:
+    sparse = None    # the overlap product falls back to a NumPy postings join
+
+SPARSE_BLOCK_ROWS = 4096   # synset rows per block of the overlap product
+
+
+def incidenceMatrix(ids, offsets, numIds):
+    """Returns the scipy CSR row x lemma-id incidence matrix of a CSR id table."""
+    return sparse.csr_matrix((np.ones(len(ids), dtype=np.int32), ids, offsets),
+                             shape=(len(offsets)-1, numIds))
+
+
+def overlapTriplesScipy(wnIds, wnOffsets, wkIds, wkOffsets, numIds, blockRows):
+    """
+    Returns the COO triples (wnRow, wkRow, count) of the nonzero
+    entries of the product of the synset x lemma and the
+    lemma x defkey incidence matrices, sorted by wnRow then wkRow.
+    """
+    wnMatrix = incidenceMatrix(wnIds, wnOffsets, numIds)
+    wkMatrixT = incidenceMatrix(wkIds, wkOffsets, numIds).T.tocsr()
+    wnRowList = []; wkRowList = []; countList = []
+    for blockStart in range(0, wnMatrix.shape[0], blockRows):
+        product = (wnMatrix[blockStart:blockStart+blockRows] @ wkMatrixT).tocoo()
+        order = np.lexsort((product.col, product.row))
+        wnRowList.append(product.row[order].astype(np.int64) + blockStart)
+        wkRowList.append(product.col[order].astype(np.int64))
+        countList.append(product.data[order].astype(np.int64))
+    return concatTriples(wnRowList, wkRowList, countList)
+
+
+def overlapTriplesNumpy(wnIds, wnOffsets, wkIds, wkOffsets, numIds, blockRows):
+    """
+    Computes the same COO triples as overlapTriplesScipy with NumPy
+    alone, joining the synset lemma ids with the defkey postings.
+    """
+    postingRows, postingOffsets = lemma_vocab.buildIdPostings(wkIds, wkOffsets, numIds)
+    numWkRows = len(wkOffsets)-1
+    numWnRows = len(wnOffsets)-1
+    wnRowList = []; wkRowList = []; countList = []
+    for blockStart in range(0, numWnRows, blockRows):
+        blockRowIds = np.arange(blockStart, min(blockStart+blockRows, numWnRows), dtype=np.int64)
+        lemmaIds, segIndex = lemma_vocab.gatherRows(wnIds, wnOffsets, blockRowIds)
+        wkRows, joinIndex = lemma_vocab.gatherRows(postingRows, postingOffsets, lemmaIds)
+        pairKeys = (segIndex[joinIndex] + blockStart) * numWkRows + wkRows
+        pairKeys, counts = np.unique(pairKeys, return_counts=True)
+        wnRowList.append(pairKeys // numWkRows)
+        wkRowList.append(pairKeys % numWkRows)
+        countList.append(counts.astype(np.int64))
+    return concatTriples(wnRowList, wkRowList, countList)
+
+
+def concatTriples(wnRowList, wkRowList, countList):
+    if not wnRowList:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    return np.concatenate(wnRowList), np.concatenate(wkRowList), np.concatenate(countList)
+
+
+def overlapTriples(wnIds, wnOffsets, wkIds, wkOffsets, numIds, blockRows=SPARSE_BLOCK_ROWS):
+    """Returns the nonzero overlap COO triples, with scipy.sparse if it is installed."""
+    if sparse is not None:
+        return overlapTriplesScipy(wnIds, wnOffsets, wkIds, wkOffsets, numIds, blockRows)
+    return overlapTriplesNumpy(wnIds, wnOffsets, wkIds, wkOffsets, numIds, blockRows)
+
+
+def lookupCounts(pairKeys, tripleKeys, tripleCounts):
+    """Returns the count of each pair key in the sorted triple keys, or 0 if absent."""
+    if len(tripleKeys) == 0:
+        return np.zeros(len(pairKeys), dtype=np.int64)
+    pos = np.searchsorted(tripleKeys, pairKeys)
+    pos[pos == len(tripleKeys)] = 0
+    return np.where(tripleKeys[pos] == pairKeys, tripleCounts[pos], 0)
+
+
+def computeSparseAlignment(wnTable, wkTable, numIds, headIds, thresholds=CandThresholds()):
+    """
+    Computes the alignments of all the synsets in wnTable against
+    all the defkeys in wkTable with two sparse overlap products, one
+    for the source language lemmas and one for the other languages.
+    The candidate rules of idScoreAlignment, with the given thresholds,
+    are applied as masks over the overlap triples. headIds holds, for each defkey row, the id
+    of its source language headword record, or -1 if it is not in
+    the vocabulary. Returns the sorted AlignStatsRecord list of each
+    aligned wncode, in wnTable order.
+    """
+    numWkRows = len(wkTable)
+    if numWkRows == 0 or len(wnTable) == 0:
+        return []
+
+    srcWnRows, srcWkRows, srcCounts = overlapTriples(wnTable.srcIds, wnTable.srcOffsets,
+                                                     wkTable.srcIds, wkTable.srcOffsets, numIds)
+    langWnRows, langWkRows, langCounts = overlapTriples(wnTable.langIds, wnTable.langOffsets,
+                                                        wkTable.langIds, wkTable.langOffsets, numIds)
+
+    # the pairs with a nonzero source or other language overlap
+    srcKeys = srcWnRows * numWkRows + srcWkRows
+    langKeys = langWnRows * numWkRows + langWkRows
+    pairKeys = np.union1d(srcKeys, langKeys)
+    wnRows = pairKeys // numWkRows
+    wkRows = pairKeys % numWkRows
+    srcMatch = lookupCounts(pairKeys, srcKeys, srcCounts)
+    langMatch = lookupCounts(pairKeys, langKeys, langCounts)
+
+    srcMax = np.minimum(wnTable.srcCounts[wnRows], wkTable.srcCounts[wkRows]).astype(np.int64)
+    langMax = np.minimum(wnTable.langCounts[wnRows], wkTable.langCounts[wkRows]).astype(np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        srcPc = np.where(srcMax > 0, srcMatch / srcMax, 0.0)
+        langPc = np.where(langMax > 0, langMatch / langMax, 0.0)
+
+    t = thresholds
+    isCand = ( (langPc >= t.langPc) |
+               ( (srcPc >= t.srcPc) & ((langPc >= t.srcLangPc) |
+                                      ((langPc >= t.minLangPc) & (langMatch > t.minLangMatch))) ) ).astype(np.int64)
+
+    # isCand is 2 when the source language headword of the defkey
+    # is one of the source language lemmas of the synset
+    wnSrcRows = np.repeat(np.arange(len(wnTable), dtype=np.int64), np.diff(wnTable.srcOffsets))
+    wnSrcKeys = np.sort(wnSrcRows * numIds + wnTable.srcIds)
+    pairHeadIds = headIds[wkRows]
+    headKeys = wnRows * numIds + pairHeadIds
+    hasHead = (pairHeadIds >= 0) & (lookupCounts(headKeys, wnSrcKeys, np.ones(len(wnSrcKeys), dtype=np.int64)) > 0)
+    isCand[(isCand == 1) & hasHead] = 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = np.where((isCand >= 1) & (langMax > 0), langMatch / np.sqrt(langMax), 0.0)
+
+    # keep the candidates, and sort them per synset by descending isCand,
+    # descending score, descending srcMatch, then defkey order
+    keep = isCand > 0
+    fields = [ arr[keep] for arr in (wnRows, wkRows, srcMatch, langMatch, srcMax, langMax,
+                                     srcPc, langPc, score, isCand) ]
+    order = np.lexsort((fields[1], -fields[2], -fields[8], -fields[9], fields[0]))
+    fields = [ arr[order].tolist() for arr in fields ]
+
+    alignList = []
+    currentRow = -1; statsList = []
+    for wnRow, wkRow, sMatch, lMatch, sMax, lMax, sPc, lPc, sc, cand in zip(*fields):
+        if wnRow != currentRow:
+            if statsList:
+                alignList.append((wnTable.keys[currentRow], statsList))
+            currentRow = wnRow; statsList = []
+        statsList.append(AlignStatsRecord(wkTable.keys[wkRow], sMatch, lMatch, sMax, lMax,
+                                          sPc if sMax > 0 else 0, lPc if lMax > 0 else 0,
+                                          score=sc if lMax > 0 else 0, isCand=cand))
+    if statsList:
+        alignList.append((wnTable.keys[currentRow], statsList))
+    return alignList
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+import datetime
+import contextlib
+import dbywkt_parser as dbyparser
+import artifact_store
+import evaluator
+from ds import CandThresholds
+
+
+STAGES = ["extract", "build", "align", "evaluate"]
+
+STAGE_MANIFEST_FILENAME = "stages.json"   # key and outputs of each stage of the last runs
+EXTRACT_FILENAME = "dbyExtract.p"
+BUILD_FILENAMES = ["dictWkTrans.col", "dictWkSynm.col", "dictWnTrans.col", "dictWkDef.col", "dictWnStats.json"]
+ALIGN_FILENAME = "align-all.p"
+EVAL_REPORT_FILENAME = "eval-report.txt"
+EVAL_SAMPLE_FILENAMES = ["align-results-sample.txt"]
+EVAL_EXPORT_FILENAMES = ["align-results.tsv", "align-results-sample.jsonl"]
+ARTIFACT_DB_FILENAME = "artifacts.db"   # SQLite artifact store written with --sqlite
+CHECKSUM_BLOCK_SIZE = 1 << 20
+
+DEFAULT_DBY_FILE_PATH = "../../dbnary/downloads/en_dbnary_lemon_july.ttl.bz2"
+DEFAULT_WNDB_FILE_PATH = "../../data/sqlite_db/wn-multix.db"
+
+# source files whose content is the code version of each stage
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGE_SOURCES = { "extract": ["dbywkt_parser.py", "dby_reader.py", "wordnet_read.py", "lemma_norm.py",
+                              "def_keys.py", "ds.py", "gen_utils.py"],
+                  "build": ["dbywkt_parser.py", "def_keys.py", "ds.py", "gen_utils.py",
+                            "columnar_store.py", "artifact_store.py"],
+                  "align": ["dbywkt_parser.py", "lemma_vocab.py", "sparse_align.py", "def_keys.py",
+                            "ds.py", "gen_utils.py", "columnar_store.py", "artifact_store.py"],
+                  "evaluate": ["evaluator.py", "align_export.py", "wordnet_read.py", "gen_utils.py",
+                               "columnar_store.py", "artifact_store.py", "ds.py"] }
+
+
+def loadManifest():
+    if not os.path.exists(STAGE_MANIFEST_FILENAME):
+        return { "stages": {}, "checksums": {} }
+    with open(STAGE_MANIFEST_FILENAME, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def saveManifest(manifest):
+    tmpFileName = STAGE_MANIFEST_FILENAME + ".tmp"
+    with open(tmpFileName, "w", encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmpFileName, STAGE_MANIFEST_FILENAME)
+
+
+def getFileChecksum(filePath, manifest):
+    """
+    Returns the SHA1 checksum of the content of a file, or None if there
+    is no such file. The checksums are kept in the manifest with the size
+    and modification time of the file, so that an unchanged file is not
+    read again.
+    """
+    filePath = os.path.abspath(filePath)
+    if not os.path.exists(filePath):
+        return None
+    st = os.stat(filePath)
+    cached = manifest["checksums"].get(filePath)
+    if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    sha1 = hashlib.sha1()
+    with open(filePath, "rb") as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b""):
+            sha1.update(block)
+    manifest["checksums"][filePath] = [st.st_size, st.st_mtime_ns, sha1.hexdigest()]
+    return sha1.hexdigest()
+
+
+def getInputChecksum(filePath, manifest, description):
+    """Returns the checksum of an input file, which must exist."""
+    checksum = getFileChecksum(filePath, manifest)
+    if checksum is None:
+        raise FileNotFoundError("No %s file: %s" % (description, os.path.abspath(filePath)))
+    return checksum
+
+
+def getCodeVersion(stage):
+    """Returns the hash of the source files of a stage."""
+    sha1 = hashlib.sha1()
+    for fileName in STAGE_SOURCES[stage]:
+        with open(os.path.join(SOURCE_DIR, fileName), "rb") as f:
+            sha1.update(fileName.encode('utf-8') + b"\0" + f.read() + b"\0")
+    return sha1.hexdigest()
+
+
+def getStageParams(stage, options, manifest):
+    """Returns the inputs of a stage other than the outputs of the previous one."""
+    if stage == "extract":
+        # the source language is given by the name of the dump
+        return { "dump": getInputChecksum(options.dump, manifest, "DBnary dump"),
+                 "dumpName": os.path.basename(options.dump),
+                 "wordnet": getInputChecksum(options.wordnet, manifest, "wordnet database"),
+                 "langCodes": getFileChecksum(dbyparser.DBY_LANG_CODES_FILENAME, manifest),
+                 "projection": repr(sorted(dbyparser.ALIGN_PROJECTION.items())) }
+    if stage == "build":
+        return { "sqlite": options.sqlite }
+    if stage == "align":
+        return { "engine": options.engine, "thresholds": list(options.thresholds), "sqlite": options.sqlite }
+    return { "sqlite": options.sqlite, "export": options.export,
+             "langNames": getFileChecksum("langnames.tab", manifest) }
+
+
+def getStageOutputs(stage, options):
+    if stage == "extract":
+        return [EXTRACT_FILENAME]
+    if stage == "build":
+        return BUILD_FILENAMES + ([ARTIFACT_DB_FILENAME] if options.sqlite else [])
+    if stage == "align":
+        return [ALIGN_FILENAME] + ([ARTIFACT_DB_FILENAME] if options.sqlite else [])
+    return [EVAL_REPORT_FILENAME] + EVAL_SAMPLE_FILENAMES + (EVAL_EXPORT_FILENAMES if options.export else [])
+
+
+def getStageKey(prevKey, params, codeVersion):
+    content = json.dumps({ "prev": prevKey, "params": params, "code": codeVersion }, sort_keys=True)
+    return hashlib.sha1( content.encode('utf-8') ).hexdigest()
+
+
+def runExtract(options, runState):
+    dbyparser.extractData(options.dump, options.wordnet, options.log_level, options.log_file,
+                          options.workers, dbyparser.ALIGN_PROJECTION, options.resume, build=False)
+    dbyparser.dumpExtractedData(EXTRACT_FILENAME)
+    runState["extracted"] = True
+
+
+def runBuild(options, runState):
+    if not runState["extracted"] and not dbyparser.loadExtractedData(EXTRACT_FILENAME):
+        raise RuntimeError("No extracted data to build from in "+EXTRACT_FILENAME)
+    # the inputs of the previous run, to update its alignments
+    if runState["incrementalAlign"]:
+        runState["prevInputs"] = dbyparser.loadAlignmentInputs()
+    dbyparser.buildData()
+    dbyparser.pickleDump()
+    if options.sqlite:
+        artifact_store.writeArtifacts(ARTIFACT_DB_FILENAME, {"wk_def": dbyparser.dictWkDef, "wk_trans": dbyparser.dictWkTrans,
+                                                             "wk_synm": dbyparser.dictWkSynm, "wn_trans": dbyparser.dictWnTrans})
+    runState["built"] = True
+
+
+def runAlign(options, runState):
+    if not runState["built"]:
+        dbyparser.loadBuiltData(options.dump)
+    dbyparser.candThresholds = options.thresholds
+    if runState["prevInputs"] is not None:
+        dbyparser.updateAlignStats(ALIGN_FILENAME, runState["prevInputs"], options.workers, options.engine)
+    else:
+        dbyparser.getAlignStats(options.dump, ALIGN_FILENAME, options.workers, options.engine)
+    if options.sqlite:
+        artifact_store.writeArtifacts(ARTIFACT_DB_FILENAME, {"alignment": dbyparser.dictAlignments})
+
+
+def runEvaluate(options, runState):
+    tmpFileName = EVAL_REPORT_FILENAME + ".tmp"
+    with open(tmpFileName, "w", encoding='utf-8') as f, contextlib.redirect_stdout(f):
+        evaluator.main(ARTIFACT_DB_FILENAME if options.sqlite else "", options.workers,
+                       options.export, [ALIGN_FILENAME])
+    os.replace(tmpFileName, EVAL_REPORT_FILENAME)
+
+
+STAGE_RUNNERS = { "extract": runExtract, "build": runBuild, "align": runAlign, "evaluate": runEvaluate }
+
+
+def isIncrementalAlign(options, manifest, stageEntries):
+    """
+    Tells whether the alignments of the previous run can be updated
+    instead of computed again: with --incremental, when the previous
+    build and alignment outputs exist, and the alignments were computed
+    from the build outputs on disk, with the same code and parameters.
+    """
+    prevAlign = manifest["stages"].get("align")
+    prevBuild = manifest["stages"].get("build")
+    return options.incremental and prevAlign is not None and prevBuild is not None and \
+           prevAlign.get("buildKey") == prevBuild["key"] and \
+           all( os.path.exists(fileName) for fileName in BUILD_FILENAMES + [ALIGN_FILENAME] ) and \
+           prevAlign["code"] == stageEntries["align"]["code"] and \
+           prevAlign["params"] == stageEntries["align"]["params"]
+
+
+def runStages(targetStage, options):
+    """
+    Runs the stages up to targetStage. The key of a stage is the hash of
+    the key of the previous stage, of its own inputs and parameters, and
+    of its code version; a stage whose key and outputs are those of a
+    previous run is skipped, unless forced.
+    """
+    manifest = loadManifest()
+    stages = STAGES[:STAGES.index(targetStage)+1]
+
+    stageEntries = {}
+    prevKey = ""
+    for stage in stages:
+        params = getStageParams(stage, options, manifest)
+        codeVersion = getCodeVersion(stage)
+        prevKey = getStageKey(prevKey, params, codeVersion)
+        stageEntries[stage] = { "key": prevKey, "params": params, "code": codeVersion,
+                                "outputs": getStageOutputs(stage, options) }
+    if "align" in stageEntries:
+        # the build outputs the alignments are computed from
+        stageEntries["align"]["buildKey"] = stageEntries["build"]["key"]
+    saveManifest(manifest)   # with the checksums computed
+
+    runState = { "extracted": False, "built": False, "prevInputs": None,
+                 "incrementalAlign": False }
+    for stage in stages:
+        entry = stageEntries[stage]
+        prevEntry = manifest["stages"].get(stage)
+        if stage not in options.force and prevEntry is not None and prevEntry["key"] == entry["key"] and \
+           all( os.path.exists(fileName) for fileName in entry["outputs"] ):
+            print("Stage", stage, "is up to date; skipped")
+            continue
+        if stage == "build":
+            runState["incrementalAlign"] = "align" in stages and isIncrementalAlign(options, manifest, stageEntries)
+        print("Stage", stage, "started:", datetime.datetime.now())
+        STAGE_RUNNERS[stage](options, runState)
+        print("Stage", stage, "done:", datetime.datetime.now())
+        manifest["stages"][stage] = entry
+        saveManifest(manifest)
+
+    if targetStage == "evaluate":
+        with open(EVAL_REPORT_FILENAME, "r", encoding='utf-8') as f:
+            sys.stdout.write(f.read())
+
+
+def parseThresholds(value):
+    values = value.split(",")
+    if len(values) != len(CandThresholds._fields):
+        raise argparse.ArgumentTypeError("expected %d comma-separated values: %s" %
+                                         (len(CandThresholds._fields), ", ".join(CandThresholds._fields)))
+    return CandThresholds(*[ float(x) for x in values[:-1] ], int(values[-1]))
+
+
+def getArgParser():
+    argParser = argparse.ArgumentParser(description="Runs the stages of the synset alignment: extract "
+                                                    "the DBnary dump and the wordnet translations, build the "
+                                                    "dictionaries for alignment, align and evaluate. The stages "
+                                                    "whose inputs, parameters and code are unchanged are skipped.")
+    argParser.add_argument("stage", nargs="?", choices=STAGES, default="evaluate",
+                           help="last stage to run (default: evaluate)")
+    argParser.add_argument("--dump", default=DEFAULT_DBY_FILE_PATH, help="DBnary dump (.ttl.bz2)")
+    argParser.add_argument("--wordnet", default=DEFAULT_WNDB_FILE_PATH, help="wordnet SQLite database")
+    argParser.add_argument("--workers", type=int, default=1, help="worker processes")
+    argParser.add_argument("--engine", choices=["postings", "interned", "sparse"], default="postings",
+                           help="alignment engine")
+    argParser.add_argument("--thresholds", type=parseThresholds, default=CandThresholds(),
+                           help="candidate thresholds "+",".join(CandThresholds._fields)+
+                                " (default: "+",".join(map(str, CandThresholds()))+")")
+    argParser.add_argument("--sqlite", action="store_true",
+                           help="also write the artifacts into the SQLite store "+ARTIFACT_DB_FILENAME+
+                                ", and evaluate from it")
+    argParser.add_argument("--export", action="store_true", help="also export the alignments as TSV and JSONL")
+    argParser.add_argument("--resume", action="store_true",
+                           help="continue the DBnary extraction from its last checkpoint")
+    argParser.add_argument("--incremental", action="store_true",
+                           help="update the alignments of the previous run instead of computing them again")
+    argParser.add_argument("--force", action="append", choices=STAGES, default=[],
+                           help="run a stage even if it is up to date")
+    argParser.add_argument("--log-level", default="warning")
+    argParser.add_argument("--log-file", default="")
+    return argParser
+
+
+def main(argv=None):
+    options = getArgParser().parse_args(argv)
+    dbyparser.configureLogging(options.log_level, options.log_file)
+    runStages(options.stage, options)
+
+
+if __name__ == "__main__":
+    main()
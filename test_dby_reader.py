@@ -0,0 +1,75 @@
+import bz2
+import random
+import pytest
+import dby_reader
+
+
+def makeMultiBlockBz2(numLines=40000):
+    """Returns text and its bz2 compression in several 100k blocks."""
+    rnd = random.Random(7)
+    words = [ "w%d" % i for i in range(5000) ]
+    text = "".join( " ".join(rnd.choice(words) for _ in range(8)) + "\n" for _ in range(numLines) ).encode('utf-8')
+    return text, bz2.compress(text, compresslevel=1)
+
+
+def getBlockRanges(compressed):
+    return [ blockRange for blockRange in dby_reader.findBz2Blocks(compressed) if blockRange[2] ]
+
+
+def test_split_blocks_match_bz2_decompress():
+    text, compressed = makeMultiBlockBz2()
+    blockRanges = getBlockRanges(compressed)
+    assert len(blockRanges) > 2
+    blocks = [ dby_reader.decompressBz2Block(*dby_reader.getBlockChunk(compressed, startBit, endBit))
+               for startBit, endBit, _ in blockRanges ]
+    assert b"".join(blocks) == bz2.decompress(compressed) == text
+
+
+def test_false_magics_are_merged_into_their_block():
+    text, compressed = makeMultiBlockBz2()
+    allRanges = dby_reader.findBz2Blocks(compressed)
+    startBit, endBit, _ = allRanges[0]
+    # a false end-of-stream magic, then a false block magic, inside the first block
+    splitBits = [ startBit + (endBit-startBit)//3, startBit + 2*(endBit-startBit)//3 ]
+    ranges = [ (startBit, splitBits[0], True), (splitBits[0], splitBits[1], False),
+               (splitBits[1], endBit, True) ] + allRanges[1:]
+    block, nextRange = dby_reader.decompressMergedRanges(compressed, ranges, 0, {})
+    assert nextRange == 3
+    assert block == dby_reader.decompressBz2Block(*dby_reader.getBlockChunk(compressed, startBit, endBit))
+
+
+def test_parallel_read_falls_back_to_sequential(tmp_path, monkeypatch):
+    text, compressed = makeMultiBlockBz2()
+    filePath = tmp_path / "multi.bz2"
+    filePath.write_bytes(compressed)
+    allRanges = dby_reader.findBz2Blocks(compressed)
+    # a missed block magic: the merged ranges span two blocks and fail their CRC
+    ranges = [ (allRanges[1][0], allRanges[2][1], True) ] + allRanges[3:]
+    monkeypatch.setattr(dby_reader, "findBz2Blocks", lambda data: allRanges[:1] + ranges)
+    blocks = list(dby_reader.iterParallelBz2Blocks(str(filePath), 2))
+    assert b"".join( block for _, _, block in blocks ) == text
+    assert all( blockOffset == sum( len(block) for _, _, block in blocks[:i] )
+                for i, (_, blockOffset, _) in enumerate(blocks) )
+
+
+def test_parallel_read_of_truncated_file_raises(tmp_path):
+    text, compressed = makeMultiBlockBz2()
+    filePath = tmp_path / "truncated.bz2"
+    filePath.write_bytes(compressed[:len(compressed)*2//3])
+    blockRanges = dby_reader.findBz2Blocks(filePath.read_bytes())
+    assert blockRanges[-1][2] and blockRanges[-1][1] == filePath.stat().st_size*8
+    with pytest.raises(EOFError):
+        list(dby_reader.iterParallelBz2Blocks(str(filePath), 2))
+
+
+def test_parallel_read_checks_stream_crc(tmp_path):
+    text, compressed = makeMultiBlockBz2()
+    # the stream CRC follows the end-of-stream magic
+    eosBit = dby_reader.findBz2Blocks(compressed)[-1][1]
+    crcBit = eosBit + 48 + 31
+    corrupted = bytearray(compressed)
+    corrupted[crcBit//8] ^= 0x80 >> (crcBit % 8)
+    filePath = tmp_path / "badcrc.bz2"
+    filePath.write_bytes(bytes(corrupted))
+    with pytest.raises(OSError):
+        list(dby_reader.iterParallelBz2Blocks(str(filePath), 2))
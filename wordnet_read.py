@@ -7,23 +7,56 @@ import gen_utils
 from collections import namedtuple
 import math
 import sqlite3
+import pathlib
 from gen_utils import uprint
-from ds import WnDByTransRecord, WnSenseDef
+from ds import WnDByTransRecord, WnSenseDef, RecordBucket
 
 
 
 logger = logging.getLogger(__name__)
 logger = logutil.logConfigure(__name__, logFileName="log_wordnet.txt", inputLogLevel="debug")
 
-# Make connection to an SQLite database file
+WN_FETCH_ROWS = 10000   # rows per fetchmany call
+
+# pragmas applied to the read-only connections
+WN_READ_PRAGMAS = { "query_only": 1,
+                    "mmap_size": 1 << 30,   # bytes of the database memory-mapped
+                    "cache_size": -65536 }  # page cache, in KiB
+
+# Make a read-only connection to an SQLite database file; the path is
+# quoted in the URI, and the connection errors are raised to the caller
 def connect(sqlite_file):
-	try:
-		conn = sqlite3.connect(sqlite_file)
-		return conn
-	except sqlite3.Error as e:
-		logger.exception("Error %s", e.args[0])
-		print("Error "+ e.args[0])
-		return None
+	conn = sqlite3.connect(pathlib.Path(sqlite_file).resolve().as_uri() + "?mode=ro", uri=True)
+	for pragma, value in WN_READ_PRAGMAS.items():
+		conn.execute("PRAGMA %s=%d" % (pragma, value))
+	return conn
+
+
+
+def iterRows(cur, numRows=WN_FETCH_ROWS):
+    """Yields the rows of an executed query, fetched numRows at a time."""
+    rows = cur.fetchmany(numRows)
+    while rows:
+        yield from rows
+        rows = cur.fetchmany(numRows)
+
+
+def getFilterSql(column, values):
+    """
+    Returns the SQL condition restricting a column to the given values,
+    and its parameters; no condition if values is None.
+    """
+    if values is None:
+        return [], []
+    values = list(values)
+    return [ "%s IN (%s)" % (column, ", ".join("?"*len(values))) ], values
+
+
+def getPosFilterValues(poss):
+    # satellite adjectives are read as adjectives
+    if poss is None or "a" not in poss:
+        return poss
+    return list(poss) + ["s"]
 
 
 
@@ -36,80 +69,99 @@ def close(conn):
 
 
 
-def getWnTrans(dbFilePath):
+def getWnTrans(dbFilePath, langs=None, poss=None):
     """ Gets the wordnet translations.  To get the lemma for the synsets,
-	    we join two tables: sense, word.
+	    we join two tables: sense, word. The rows can be restricted to
+	    some languages and parts of speech (n, v, a, r). The records of
+	    each synset are returned in a RecordBucket.
 	"""
 
     conn = connect(dbFilePath)
 
     dictWnTrans = {}
 
-    if conn:
-
-        sqlString = "SELECT s.synset, w.lemma, w.pos, s.lang "+\
-                    "FROM 'sense' s, 'word' w "+\
-                    "WHERE s.wordid=w.wordid AND s.lang=w.lang AND s.confidence=1"
-
-        cur = conn.cursor()
-        cur.execute(sqlString)
-        resList = cur.fetchall()
-        if resList:
-            logger.info("Number of rows retrieved for WnSenseDef: "+str(len(resList)))
-            for i in range(0, len(resList)):
-                key, lemma, pos, lang = resList[i]
-                if pos=="s":
-                    pos = "a"
-                newRecord = WnDByTransRecord(lemma=lemma.lower(), pos=pos, lang=lang, ignore=0)
-                if key in dictWnTrans:
-                    dictWnTrans[key].append(newRecord)
-                else:
-                    dictWnTrans[key] = [newRecord]
+    langFilter, langParams = getFilterSql("s.lang", langs)
+    posFilter, posParams = getFilterSql("w.pos", getPosFilterValues(poss))
+    sqlString = "SELECT s.synset, w.lemma, w.pos, s.lang "+\
+                "FROM 'sense' s, 'word' w "+\
+                "WHERE "+" AND ".join(["s.wordid=w.wordid AND s.lang=w.lang AND s.confidence=1"]+
+                                      langFilter+posFilter)
+
+    cur = conn.cursor()
+    cur.execute(sqlString, langParams+posParams)
+    numRows = 0
+    for key, lemma, pos, lang in iterRows(cur):
+        numRows += 1
+        if pos=="s":
+            pos = "a"
+        newRecord = WnDByTransRecord(lemma=lemma.lower(), pos=pos, lang=lang, ignore=0)
+        if key in dictWnTrans:
+            dictWnTrans[key].append(newRecord)
         else:
-            logger.debug("Nothing was returned in execution of the SQL query.")
-        conn.close()
+            dictWnTrans[key] = [newRecord]
+    if numRows:
+        logger.info("Number of rows retrieved for WnSenseDef: "+str(numRows))
+    else:
+        logger.debug("Nothing was returned in execution of the SQL query.")
 
     close(conn)
 
-    return dictWnTrans
+    return { key: RecordBucket(recList) for key, recList in dictWnTrans.items() }
+
+
+def getWnTransStats(dictWnTrans):
+    """ Counts, for each synset pos (the suffix of its code), the synsets,
+	    and by language the synsets with a lemma and the lemmas.
+	"""
+    dictStats = { "synsets": {}, "langSynsets": {}, "langSenses": {} }
+    for key, recList in dictWnTrans.items():
+        pos = key[-1]
+        dictStats["synsets"][pos] = dictStats["synsets"].get(pos, 0) + 1
+        langSynsets = dictStats["langSynsets"].setdefault(pos, {})
+        langSenses = dictStats["langSenses"].setdefault(pos, {})
+        for lang in set( rec.lang for rec in recList ):
+            langSynsets[lang] = langSynsets.get(lang, 0) + 1
+        for rec in recList:
+            langSenses[rec.lang] = langSenses.get(rec.lang, 0) + 1
+    return dictStats
+
+
+def getWnTransWithStats(dbFilePath, langs=None, poss=None):
+    """ Gets the wordnet translations, as getWnTrans, and their
+	    statistics, as getWnTransStats.
+	"""
+    dictWnTrans = getWnTrans(dbFilePath, langs, poss)
+    return dictWnTrans, getWnTransStats(dictWnTrans)
 
 
-def getWnSenseDefs(dbFilePath):
-    """ Gets the wordnet sense definitions.
+def getWnSenseDefs(dbFilePath, langs=("eng",), poss=None):
+    """ Gets the wordnet sense definitions, by default the English ones.
+	    The pos of a synset is the suffix of its code.
 	"""
 
     conn = connect(dbFilePath)
 
     dictWnSenseDef = {}
 
-    if conn:
-
-        sqlString = "SELECT synset, lang, def "+\
-                    "FROM synset_def "+\
-                    "WHERE lang='eng'"
-
-        cur = conn.cursor()
-        cur.execute(sqlString)
-        resList = cur.fetchall()
-        if resList:
-            print("Number of rows retrieved for WnSenseDef: "+str(len(resList)))
-            for i in range(0, len(resList)):
-                key, lang, definition = resList[i]
-                newRecord = WnSenseDef(wncode=key, lang=lang, definition=definition)
-                dictWnSenseDef[key] = newRecord
-        else:
-            logger.debug("Nothing was returned in execution of the SQL query.")
+    langFilter, langParams = getFilterSql("lang", langs)
+    posFilter, posParams = getFilterSql("substr(synset, -1)", getPosFilterValues(poss))
+    sqlString = "SELECT synset, lang, def "+\
+                "FROM synset_def"
+    if langFilter+posFilter:
+        sqlString += " WHERE "+" AND ".join(langFilter+posFilter)
+
+    cur = conn.cursor()
+    cur.execute(sqlString, langParams+posParams)
+    numRows = 0
+    for key, lang, definition in iterRows(cur):
+        numRows += 1
+        newRecord = WnSenseDef(wncode=key, lang=lang, definition=definition)
+        dictWnSenseDef[key] = newRecord
+    if numRows:
+        print("Number of rows retrieved for WnSenseDef: "+str(numRows))
+    else:
+        logger.debug("Nothing was returned in execution of the SQL query.")
 
     close(conn)
 
     return dictWnSenseDef
-
-
-
-
-
-
-
-
-
-